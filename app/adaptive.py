@@ -0,0 +1,144 @@
+"""
+Adaptive question selection for shorter assessments
+
+Each MBTI axis is a binary unknown tracked as a log-odds belief. Answers are
+modelled as noisy votes: a respondent picks an option pointing at their own
+letter with weight ``accuracy``, one pointing at the opposite letter with
+weight ``1 - accuracy`` and one saying nothing about the axis with weight 0.5,
+normalised over the question's options. From that model every option gets a
+precomputed per-axis log-likelihood ratio, so updating the belief after an
+answer is one row lookup and an add.
+
+The next question is the unasked one with the highest expected information
+gain (mutual information between the answer and the axis) on the
+least-determined axis, and the assessment stops once every axis is decided
+with ``confidence``. Gains are computed for all candidate questions of an axis
+in one vectorised pass over precomputed likelihood tables.
+"""
+import numpy as np
+
+from app.scoring import types_from_signs
+
+# Axis names in score vector order (see app.scoring.TRAITS)
+AXES = ("EI", "SN", "TF", "JP")
+
+
+class AdaptiveEngine:
+    """
+    Question selection and stopping rule compiled from a TraitScorer
+    """
+
+    def __init__(self, scorer, accuracy=0.8, confidence=0.9, max_questions=0):
+        if not 0.5 < accuracy < 1:
+            raise ValueError(f"Answer accuracy must be between 0.5 and 1, got {accuracy}")
+        if not 0.5 < confidence < 1:
+            raise ValueError(f"Confidence must be between 0.5 and 1, got {confidence}")
+        self.scorer = scorer
+        self.accuracy = accuracy
+        self.confidence_target = confidence
+        self.max_questions = max_questions or len(scorer.question_ids)
+        # Decided once the log-odds reach this magnitude
+        self._decided_logodds = np.log(confidence / (1 - confidence))
+        self.question_position = {qid: i for i, qid in enumerate(scorer.question_ids)}
+
+        sizes = np.array([len(q["options"]) for q in scorer.questions], dtype=np.intp)
+        width = int(sizes.max(initial=0))
+        offsets = np.array(scorer.option_offsets, dtype=np.intp)
+        slots = np.arange(width)
+        padding = slots[None, :] >= sizes[:, None]
+        rows = np.where(padding, scorer.null_row, offsets[:, None] + slots[None, :])
+
+        # Unnormalised likelihood of picking each option given each axis's
+        # first (``first``) or second letter, then normalised per question
+        signs = scorer.vectors[:, 0::2] - scorer.vectors[:, 1::2]
+        first = np.where(signs > 0, accuracy, np.where(signs < 0, 1 - accuracy, 0.5))[rows]
+        first[padding] = 0.0
+        second = np.where(padding[..., None], 0.0, 1 - first)
+        first /= np.maximum(first.sum(axis=1, keepdims=True), 1e-12)
+        second /= np.maximum(second.sum(axis=1, keepdims=True), 1e-12)
+
+        with np.errstate(divide="ignore"):
+            log_first = np.where(padding[..., None], 0.0, np.log(first))
+            log_second = np.where(padding[..., None], 0.0, np.log(second))
+
+        # Per-option log-likelihood ratio for each axis; the null row adds nothing
+        self.weights = np.zeros((scorer.null_row + 1, len(AXES)))
+        self.weights[rows[~padding]] = (log_first - log_second)[~padding]
+
+        # Per axis, only the questions whose answer says something about it
+        self._candidates = []
+        for axis in range(len(AXES)):
+            informative = np.flatnonzero(np.abs(log_first[..., axis] - log_second[..., axis]).max(axis=1) > 1e-12)
+            self._candidates.append((
+                informative,
+                np.ascontiguousarray(first[informative, :, axis]),
+                np.ascontiguousarray(second[informative, :, axis]),
+                np.ascontiguousarray(log_first[informative, :, axis]),
+                np.ascontiguousarray(log_second[informative, :, axis]),
+                padding[informative].astype(float),
+            ))
+
+    def evidence(self, rows):
+        """
+        Per-axis log-odds of the first letter after the answers at ``rows``
+        """
+        rows = list(rows)
+        if not rows:
+            return np.zeros(len(AXES))
+        return self.weights[rows].sum(axis=0)
+
+    def confidence(self, logodds):
+        """
+        Per-axis probability of the more likely letter
+        """
+        return 1 / (1 + np.exp(-np.abs(logodds)))
+
+    def mbti_type(self, logodds):
+        """
+        Most likely type; axes with no evidence either way use the tie-breakers
+        """
+        signs = np.where(np.abs(logodds) < 1e-9, 0, np.sign(logodds))
+        return str(types_from_signs(signs))
+
+    def gains(self, axis, logodds, asked):
+        """
+        (question positions, expected information gain in nats) for one axis
+        """
+        positions, first, second, log_first, log_second, padding = self._candidates[axis]
+        p = 1 / (1 + np.exp(-logodds[axis]))
+        joint_first = p * first
+        joint_second = (1 - p) * second
+        # Padding slots have zero probability; adding 1 there keeps the log finite
+        log_marginal = np.log(joint_first + joint_second + padding)
+        gain = (joint_first * (log_first - log_marginal) + joint_second * (log_second - log_marginal)).sum(axis=1)
+        gain[asked[positions]] = -1.0
+        return positions, gain
+
+    def next_question(self, logodds, asked):
+        """
+        Position of the next question to ask, or None once the assessment is done
+
+        ``asked`` is a boolean array over question positions. Axes are tried
+        from the least determined up; an axis with no informative question
+        left is skipped.
+        """
+        if asked.sum() >= self.max_questions:
+            return None
+        margins = np.abs(logodds)
+        for axis in np.argsort(margins, kind="stable"):
+            if margins[axis] >= self._decided_logodds:
+                return None
+            positions, gain = self.gains(axis, logodds, asked)
+            if len(gain):
+                best = int(gain.argmax())
+                if gain[best] > 0:
+                    return int(positions[best])
+        return None
+
+    def asked_mask(self, question_ids):
+        """
+        Boolean mask over question positions for the given question ids
+        """
+        asked = np.zeros(len(self.question_position), dtype=bool)
+        asked[[self.question_position[qid] for qid in question_ids]] = True
+        return asked
@@ -0,0 +1,169 @@
+"""
+Versioned on-disk bundles for the ML fallback model
+
+A bundle lives in ``<artifact_dir>/<bundle_id>/`` where the id is derived from
+the dataset hash, the embedding model name, the pooling mode, the classifier
+and the bundle format version, so a bundle is reused until one of those
+changes and bundles trained with different settings live side by side. Each
+bundle holds:
+
+- ``embeddings.npy``: the training embedding matrix (float32)
+- ``classifier.joblib``: the fitted classifier
+- ``meta.json``: label classes, dataset hash, model name, pooling mode, classifier and shapes
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Rows copied at a time when writing (possibly memory-mapped) embeddings
+COPY_BLOCK_ROWS = 65536
+
+
+def dataset_hash(path, chunk_size=1 << 20):
+    """
+    SHA-256 of the dataset file, read in fixed-size chunks
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bundle_id(data_hash, model_name, pooling="none", classifier="logreg"):
+    """
+    Stable identifier for the bundle trained from this dataset, model and settings
+
+    The default settings keep the id of bundles trained before pooling and
+    classifier choices existed, so those are not retrained.
+    """
+    key = f"{FORMAT_VERSION}:{data_hash}:{model_name}"
+    if (pooling, classifier) != ("none", "logreg"):
+        key += f":{pooling}:{classifier}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def bundle_path(artifact_dir, data_hash, model_name, pooling="none", classifier="logreg"):
+    return os.path.join(artifact_dir, bundle_id(data_hash, model_name, pooling, classifier))
+
+
+def _save_embeddings(path, embeddings):
+    """
+    Write embeddings as .npy block by block so memmaps are never fully loaded
+    """
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=embeddings.shape)
+    for start in range(0, len(embeddings), COPY_BLOCK_ROWS):
+        out[start:start + COPY_BLOCK_ROWS] = embeddings[start:start + COPY_BLOCK_ROWS]
+    out.flush()
+    del out
+
+
+def save_bundle(artifact_dir, embeddings, classifier, classes, data_hash, model_name, pooling="none",
+                classifier_name="logreg"):
+    """
+    Write a bundle atomically and return its directory
+
+    ``pooling`` records how training rows were pooled from post embeddings
+    (see app.preprocess) so serving can shape its inputs the same way, and
+    ``classifier_name`` which classifier was fitted.
+    """
+    target = bundle_path(artifact_dir, data_hash, model_name, pooling, classifier_name)
+    os.makedirs(artifact_dir, exist_ok=True)
+
+    # Build the bundle in a scratch directory and rename it into place so a
+    # crashed training run never leaves a half-written bundle behind
+    tmp_dir = tempfile.mkdtemp(prefix=".bundle-", dir=artifact_dir)
+    try:
+        _save_embeddings(os.path.join(tmp_dir, "embeddings.npy"), embeddings)
+        joblib.dump(classifier, os.path.join(tmp_dir, "classifier.joblib"))
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "dataset_hash": data_hash,
+            "model_name": model_name,
+            "pooling": pooling,
+            "classifier": classifier_name,
+            "classes": [str(c) for c in classes],
+            "n_rows": int(len(embeddings)),
+            "embedding_dim": int(embeddings.shape[1]) if len(embeddings) else 0,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(tmp_dir, target)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Saved model bundle to {target}")
+    return target
+
+
+def find_bundle(data_path, artifact_dir, model_name, pooling="none", classifier="logreg"):
+    """
+    Path of the bundle matching the current dataset, model and settings, or None if it is not trained yet
+    """
+    path = bundle_path(artifact_dir, dataset_hash(data_path), model_name, pooling, classifier)
+    return path if os.path.isfile(os.path.join(path, "meta.json")) else None
+
+
+def load_bundle(path, load_embeddings=False, mmap=True):
+    """
+    Load a bundle's metadata and classifier; embeddings are memory-mapped on request
+
+    With ``mmap`` the classifier's arrays (coefficients, intercepts) are
+    memory-mapped read-only from the bundle file, so every process serving
+    the same bundle shares one copy through the page cache.
+    """
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {meta.get('format_version')} in {path}")
+
+    bundle = {
+        "path": path,
+        "meta": meta,
+        "classes": np.array(meta["classes"]),
+        "classifier": joblib.load(os.path.join(path, "classifier.joblib"), mmap_mode="r" if mmap else None),
+        "embeddings": None,
+    }
+    if load_embeddings:
+        bundle["embeddings"] = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    return bundle
+
+
+def load_or_train(data_path, artifact_dir, model_name, encoder=None, mmap=True, pooling="none",
+                  classifier="logreg"):
+    """
+    Load the bundle matching the current dataset, model and settings, training it if missing
+
+    Bundle ids do not depend on the encoder backend, so ``encoder`` must be
+    the torch encoder; with None, training loads it.
+    """
+    data_hash = dataset_hash(data_path)
+    path = bundle_path(artifact_dir, data_hash, model_name, pooling, classifier)
+
+    if os.path.isfile(os.path.join(path, "meta.json")):
+        logger.info(f"Loading model bundle from {path}")
+        return load_bundle(path, mmap=mmap)
+
+    logger.info(f"No bundle for dataset {data_hash[:12]}, model {model_name}, pooling {pooling} "
+                f"and classifier {classifier}, training...")
+    from app.train import train_and_save
+
+    path = train_and_save(data_path, artifact_dir, model_name, encoder=encoder, pooling=pooling,
+                          classifier=classifier)
+    return load_bundle(path, mmap=mmap)
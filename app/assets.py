@@ -0,0 +1,237 @@
+"""
+Build and serve the web UI as precompressed, content-hashed static assets
+
+``python -m app.assets`` copies ``app/static`` into ``app/static/dist``:
+stylesheets and scripts get content-hashed file names (so they can be cached
+forever), ``index.html`` is rewritten to reference them, and every file gets
+gzip and, when the ``brotli`` package is installed, brotli variants.
+``PrecompressedStaticFiles`` serves the best variant the client accepts.
+
+A server started without a current build builds it at import. Builds are
+serialized with a lock file so ``uvicorn --workers N`` builds once, and a new
+build is renamed into place rather than written over the one being served.
+"""
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DIR = os.path.join(os.path.dirname(__file__), "static")
+DIST_DIR = os.path.join(SOURCE_DIR, "dist")
+
+# Assets that get content-hashed names; everything else keeps its name
+HASHED_EXTENSIONS = (".css", ".js")
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[a-z]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first; brotli variants only exist when the package is installed
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _source_files(src_dir):
+    return sorted(
+        name for name in os.listdir(src_dir)
+        if os.path.isfile(os.path.join(src_dir, name)) and not name.startswith(".")
+    )
+
+
+def source_digest(src_dir=SOURCE_DIR):
+    """
+    Digest of every source file, used to detect a stale build
+    """
+    digest = hashlib.sha256()
+    for name in _source_files(src_dir):
+        digest.update(name.encode("utf-8"))
+        with open(os.path.join(src_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _write_variants(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _install(tmp_dir, dist_dir):
+    """
+    Put a finished build in place of the current one
+
+    A directory cannot replace a non-empty one in a single rename, so the old
+    build is renamed aside and removed only once the new one is in place;
+    files are never deleted from under the live path.
+    """
+    old_dir = None
+    if os.path.isdir(dist_dir):
+        old_dir = tempfile.mkdtemp(prefix=".dist-old-", dir=os.path.dirname(dist_dir))
+        os.replace(dist_dir, old_dir)
+    try:
+        os.replace(tmp_dir, dist_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def build(src_dir=SOURCE_DIR, dist_dir=DIST_DIR):
+    """
+    Build the dist directory and return the manifest of source -> built names
+    """
+    tmp_dir = tempfile.mkdtemp(prefix=".dist-", dir=os.path.dirname(dist_dir))
+
+    files = {}
+    for name in _source_files(src_dir):
+        with open(os.path.join(src_dir, name), "rb") as f:
+            files[name] = f.read()
+
+    renamed = {}
+    for name, data in files.items():
+        stem, ext = os.path.splitext(name)
+        if ext in HASHED_EXTENSIONS:
+            renamed[name] = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        else:
+            renamed[name] = name
+
+    for name, data in files.items():
+        if name.endswith(".html"):
+            text = data.decode("utf-8")
+            for source, built in renamed.items():
+                if source != built:
+                    text = re.sub(rf'(href|src)="{re.escape(source)}"', rf'\1="{built}"', text)
+            data = text.encode("utf-8")
+        _write_variants(os.path.join(tmp_dir, renamed[name]), data)
+
+    manifest = {"source_digest": source_digest(src_dir), "files": renamed}
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _install(tmp_dir, dist_dir)
+    logger.info(f"Built {len(files)} static assets into {dist_dir} (brotli: {brotli is not None})")
+    return manifest
+
+
+def ensure_built(src_dir=SOURCE_DIR, dist_dir=DIST_DIR):
+    """
+    Rebuild the dist directory only if it is missing or older than the sources
+    """
+    if is_current(src_dir, dist_dir):
+        return False
+    # The lock file is never removed: unlinking it would let a waiting process
+    # lock a file a newcomer can no longer open
+    with open(os.path.join(os.path.dirname(dist_dir), ".dist.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another worker may have finished the build while this one waited
+        if is_current(src_dir, dist_dir):
+            return False
+        build(src_dir, dist_dir)
+    return True
+
+
+def is_current(src_dir=SOURCE_DIR, dist_dir=DIST_DIR):
+    """
+    Whether the dist directory was built from the current sources
+    """
+    try:
+        with open(os.path.join(dist_dir, "manifest.json"), "r") as f:
+            return json.load(f).get("source_digest") == source_digest(src_dir)
+    except (OSError, ValueError):
+        return False
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Content codings the client accepts, ignoring any with q=0
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves prebuilt .br/.gz variants and sets cache headers
+
+    Content-hashed files are cacheable forever; everything else (index.html)
+    must be revalidated, which the ETag turns into a cheap 304.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(full_path) else REVALIDATE_CACHE_CONTROL
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+        response = None
+        accepted = accepted_encodings(request_headers.get("accept-encoding"))
+        for coding, suffix in ENCODINGS:
+            if coding in accepted or "*" in accepted:
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                headers["Content-Encoding"] = coding
+                response = FileResponse(
+                    full_path + suffix, status_code=status_code, headers=headers,
+                    media_type=media_type, stat_result=variant_stat,
+                )
+                break
+        if response is None:
+            response = FileResponse(
+                full_path, status_code=status_code, headers=headers,
+                media_type=media_type, stat_result=stat_result,
+            )
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def lookup_path(self, path):
+        # Compressed variants are only reachable through content negotiation
+        if path.endswith((".gz", ".br")) or os.path.basename(path) == "manifest.json":
+            return "", None
+        return super().lookup_path(path)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    build()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Request-coalescing micro-batcher for model inference
+
+Concurrent callers submit single items; the batcher collects them for up to
+``max_delay`` seconds or ``max_batch_size`` items, runs one batched call in an
+executor and fans the results back out through asyncio futures.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batched calls of ``func``
+
+    ``func`` takes a list of items and returns a sequence of results of the
+    same length. It runs in ``executor``; by default a private single-thread
+    executor, so callers blocked in a shared pool can never starve it.
+    """
+
+    def __init__(self, func, max_batch_size=32, max_delay=0.005, executor=None):
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.executor = executor
+        self._own_executor = executor is None
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        if self._own_executor:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Micro-batcher started (max {self.max_batch_size} items / {self.max_delay * 1000:.1f} ms)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        # Fail anything still queued rather than leaving callers waiting forever
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    async def submit(self, item):
+        """
+        Queue one item and wait for its result (call from the batcher's loop)
+        """
+        if not self.running:
+            raise RuntimeError("Micro-batcher is not running")
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    def submit_threadsafe(self, item, timeout=None):
+        """
+        Queue one item from a worker thread and block until its result is ready
+        """
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            raise RuntimeError("submit_threadsafe() would deadlock the event loop; await submit() instead")
+        return asyncio.run_coroutine_threadsafe(self.submit(item), self._loop).result(timeout)
+
+    async def _collect(self):
+        """
+        Wait for one item, then keep collecting until the batch is full or the window closes
+        """
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(self.executor, self.func, items)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"Batched call of {len(items)} items failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                # Callers that timed out or were cancelled have already gone away
+                if not future.done():
+                    future.set_result(result)
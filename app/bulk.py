@@ -0,0 +1,233 @@
+"""
+Offline bulk scoring of archived questionnaire submissions
+
+Streams a JSONL file (one ``{"responses": [...]}`` object per line, as sent to
+/predict/batch) or a CSV file through worker processes and writes one result
+per submission, in input order, as soon as each chunk is scored. Only a
+bounded window of chunks is in memory at a time, so files of any size can be
+scored. Workers use app.model.predict_personality_batch, the same code the
+server runs, so results match the API exactly.
+
+CSV input either has a ``responses`` column holding a JSON list, or one
+column per question, in question order, holding the option text or index; a
+blank cell is an unanswered question. Records are validated with the same
+model as /predict, so a submission is accepted here exactly when the API
+would accept it.
+
+Output is JSONL (``{"index", "mbti", "explanation"}`` or ``{"index", "error"}``)
+unless the output path ends in ``.csv``.
+
+Usage:
+    python -m app.bulk INPUT OUTPUT [--workers 8] [--chunk-size 256] [--format jsonl|csv]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app import config
+from app.schemas import Answers
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress reports
+REPORT_INTERVAL = 10.0
+
+
+def detect_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def iter_chunks(path, input_format, chunk_size):
+    """
+    Yield (start_index, header, records) chunks of raw input records
+
+    Records are unparsed JSONL lines or CSV rows; blank lines are skipped and
+    do not count towards the submission index.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        header = None
+        if input_format == "csv":
+            reader = csv.reader(f)
+            header = next(reader, None)
+            records = (row for row in reader if any(cell.strip() for cell in row))
+        else:
+            records = (line for line in f if line.strip())
+
+        start = 0
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield start, header, chunk
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield start, header, chunk
+
+
+def parse_record(record, input_format, header):
+    """
+    Response list of one raw record; raises ValueError when it is malformed
+    """
+    if input_format == "jsonl":
+        return Answers.model_validate_json(record).responses
+    if "responses" in header:
+        return Answers.model_validate({"responses": json.loads(record[header.index("responses")])}).responses
+    # Every column keeps its position so answers stay on their question; a
+    # blank or missing cell becomes "", which matches no option
+    cells = [record[i].strip() if i < len(record) else "" for i in range(len(header))]
+    return Answers.model_validate({"responses": [int(c) if c.isdigit() else c for c in cells]}).responses
+
+
+def score_chunk(start, header, records, input_format):
+    """
+    Score one chunk in a worker process; returns result dicts in input order
+    """
+    from app.model import predict_personality, predict_personality_batch
+
+    results = [None] * len(records)
+    valid = []
+    for offset, record in enumerate(records):
+        try:
+            valid.append((offset, parse_record(record, input_format, header)))
+        except (ValueError, TypeError, IndexError) as e:
+            results[offset] = {"index": start + offset, "error": f"invalid record: {e}"}
+
+    try:
+        predictions = predict_personality_batch([responses for _, responses in valid])
+    except Exception:
+        # Isolate the submissions that fail (e.g. an unavailable ML fallback)
+        predictions = []
+        for _, responses in valid:
+            try:
+                predictions.append(predict_personality(responses))
+            except Exception as e:
+                predictions.append(e)
+
+    for (offset, _), prediction in zip(valid, predictions):
+        if isinstance(prediction, Exception):
+            results[offset] = {"index": start + offset, "error": f"prediction failed: {prediction}"}
+        else:
+            mbti_type, explanation = prediction
+            results[offset] = {"index": start + offset, "mbti": mbti_type, "explanation": explanation}
+    return results
+
+
+class ResultWriter:
+    """
+    Writes results as JSONL, or as CSV when the path ends in .csv
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv = csv.writer(self.file) if path.lower().endswith(".csv") else None
+        if self.csv:
+            self.csv.writerow(["index", "mbti", "explanation", "error"])
+
+    def write(self, results):
+        if self.csv:
+            self.csv.writerows(
+                [r["index"], r.get("mbti", ""), r.get("explanation", ""), r.get("error", "")] for r in results
+            )
+        else:
+            self.file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results))
+
+    def close(self):
+        self.file.close()
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process and of its largest worker, in MB
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return own, children
+
+
+def score_file(input_path, output_path, workers=None, chunk_size=None, input_format=None):
+    """
+    Score every submission in ``input_path`` into ``output_path``
+
+    Returns a stats dict with rows, failures, elapsed seconds and rows/sec.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or config.BATCH_CHUNK_SIZE
+    input_format = input_format or detect_format(input_path)
+
+    stats = {"rows": 0, "failures": 0}
+    start = time.perf_counter()
+    last_report = start
+    writer = ResultWriter(output_path)
+
+    def emit(results):
+        nonlocal last_report
+        writer.write(results)
+        stats["rows"] += len(results)
+        stats["failures"] += sum("error" in r for r in results)
+        now = time.perf_counter()
+        if now - last_report >= REPORT_INTERVAL:
+            last_report = now
+            logger.info(f"Scored {stats['rows']} rows ({stats['rows'] / (now - start):.0f} rows/sec, "
+                        f"{stats['failures']} failures)")
+
+    try:
+        chunks = iter_chunks(input_path, input_format, chunk_size)
+        if workers == 1:
+            for chunk_start, header, records in chunks:
+                emit(score_chunk(chunk_start, header, records, input_format))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                # Chunks are submitted in order and written from the head of
+                # the window, so output stays ordered and memory stays bounded
+                window = deque()
+                for chunk_start, header, records in chunks:
+                    if len(window) >= 2 * workers:
+                        emit(window.popleft().result())
+                    window.append(pool.submit(score_chunk, chunk_start, header, records, input_format))
+                while window:
+                    emit(window.popleft().result())
+    finally:
+        writer.close()
+
+    stats["elapsed"] = time.perf_counter() - start
+    stats["rows_per_sec"] = stats["rows"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score archived questionnaire submissions offline")
+    parser.add_argument("input", help="JSONL or CSV file of submissions")
+    parser.add_argument("output", help="results file (.jsonl, or .csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (1 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=config.BATCH_CHUNK_SIZE, help="submissions per work item")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the file extension)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    stats = score_file(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                       input_format=args.format)
+    own_mb, worker_mb = peak_rss_mb()
+    logger.info(
+        f"Scored {stats['rows']} rows in {stats['elapsed']:.1f}s ({stats['rows_per_sec']:.0f} rows/sec), "
+        f"{stats['failures']} failures; peak RSS {own_mb:.0f} MB (main), {worker_mb:.0f} MB (largest worker)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Thread-safe bounded LRU cache with optional TTL and byte budget
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def sizeof(value):
+    """
+    Approximate memory footprint of a cached value in bytes
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and, optionally, total bytes
+
+    Entries older than ``ttl`` seconds are treated as missing. Hit, miss and
+    eviction counters are kept for monitoring (see ``stats()``).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, max_bytes=None, sizeof=sizeof):
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes or None
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires)
+            self.current_bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes and self.current_bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
@@ -0,0 +1,109 @@
+"""
+Runtime configuration, read once from environment variables
+"""
+import os
+
+
+def _env_str(name, default):
+    return os.environ.get(name, default)
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return default if value is None else int(value)
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return default if value is None else float(value)
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Training data and persisted model artifacts
+DATA_PATH = _env_str("MBTI_DATA_PATH", "data/mbti_1.csv")
+ARTIFACT_DIR = _env_str("MBTI_ARTIFACT_DIR", "artifacts")
+EMBEDDING_MODEL = _env_str("MBTI_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Streaming training: CSV rows per chunk, posts per encoder batch, classifier
+# ("logreg", or "sgd" for datasets larger than memory) and SGD epochs
+TRAIN_CHUNK_ROWS = _env_int("MBTI_TRAIN_CHUNK_ROWS", 1000)
+TRAIN_BATCH_SIZE = _env_int("MBTI_TRAIN_BATCH_SIZE", 64)
+TRAIN_CLASSIFIER = _env_str("MBTI_TRAIN_CLASSIFIER", "logreg")
+TRAIN_EPOCHS = _env_int("MBTI_TRAIN_EPOCHS", 5)
+# Encoder processes used for training (0 = one per CPU core)
+TRAIN_WORKERS = _env_int("MBTI_TRAIN_WORKERS", 1)
+# Split rows into posts and pool their embeddings per user: "none" (encode
+# whole rows), "mean", "max" or "mean+max"
+TRAIN_POOLING = _env_str("MBTI_TRAIN_POOLING", "none")
+# Encoder backend for the ML fallback ("torch", "onnx" or "onnx-int8") and the
+# ONNX Runtime quantization config used by onnx-int8
+ENCODER_BACKEND = _env_str("MBTI_ENCODER_BACKEND", "torch")
+ONNX_QUANTIZATION = _env_str("MBTI_ONNX_QUANTIZATION", "avx2")
+# Memory-map classifier arrays from the bundle so processes share one copy
+MMAP_ARTIFACTS = _env_bool("MBTI_MMAP_ARTIFACTS", True)
+
+# Question bank file, how often to check it for changes (0 disables hot
+# reload) and how long clients may cache the /questions response
+QUESTIONS_PATH = _env_str("MBTI_QUESTIONS_PATH", "app/questions.json")
+QUESTIONS_POLL_SECONDS = _env_float("MBTI_QUESTIONS_POLL_SECONDS", 2.0)
+QUESTIONS_MAX_AGE = _env_int("MBTI_QUESTIONS_MAX_AGE", 300)
+
+# Warm up the ML fallback in the background at startup instead of loading it
+# on its first use; /readyz reports ready once it is loaded. Off by default so
+# a server that never needs the fallback never holds the encoder in memory;
+# docker-compose turns it on to take the load time off the first request
+PRELOAD_ML = _env_bool("MBTI_PRELOAD_ML", False)
+
+# Submissions scored together per chunk by the batch endpoint, and the longest
+# accepted NDJSON line in bytes (longer lines are skipped with an error line)
+BATCH_CHUNK_SIZE = _env_int("MBTI_BATCH_CHUNK_SIZE", 256)
+BATCH_MAX_LINE_BYTES = _env_int("MBTI_BATCH_MAX_LINE_BYTES", 64 * 1024)
+
+# Coalesce concurrent ML fallback requests into batched encoder calls
+ML_MICROBATCH = _env_bool("MBTI_ML_MICROBATCH", True)
+ML_BATCH_SIZE = _env_int("MBTI_ML_BATCH_SIZE", 32)
+ML_BATCH_DELAY_MS = _env_float("MBTI_ML_BATCH_DELAY_MS", 5.0)
+
+# Prediction and embedding caches (TTL in seconds, 0 disables expiry)
+RESULT_CACHE_SIZE = _env_int("MBTI_RESULT_CACHE_SIZE", 65536)
+RESULT_CACHE_TTL = _env_float("MBTI_RESULT_CACHE_TTL", 0)
+EMBEDDING_CACHE_SIZE = _env_int("MBTI_EMBEDDING_CACHE_SIZE", 4096)
+EMBEDDING_CACHE_TTL = _env_float("MBTI_EMBEDDING_CACHE_TTL", 0)
+EMBEDDING_CACHE_BYTES = _env_int("MBTI_EMBEDDING_CACHE_BYTES", 64 * 1024 * 1024)
+
+# Precompute the type of every complete answer combination at startup
+PRECOMPUTE_TRAIT_TABLE = _env_bool("MBTI_PRECOMPUTE_TRAIT_TABLE", False)
+
+# Adaptive questioning: stop once every axis is decided with this probability,
+# the assumed probability that an answer points at the respondent's own letter
+# on its axis, and an optional cap on questions asked (0 = no cap)
+ADAPTIVE_CONFIDENCE = _env_float("MBTI_ADAPTIVE_CONFIDENCE", 0.9)
+ADAPTIVE_ANSWER_ACCURACY = _env_float("MBTI_ADAPTIVE_ANSWER_ACCURACY", 0.8)
+ADAPTIVE_MAX_QUESTIONS = _env_int("MBTI_ADAPTIVE_MAX_QUESTIONS", 0)
+
+# Weight of the classifier's option probabilities against the trait evidence
+# in hybrid scoring (0 = trait evidence only)
+HYBRID_ML_WEIGHT = _env_float("MBTI_HYBRID_ML_WEIGHT", 1.0)
+
+# Dedicated inference pool: worker threads, extra queued calls admitted before
+# rejecting with 503, per-call timeout in seconds (0 disables) and the
+# Retry-After sent with rejections
+INFERENCE_WORKERS = _env_int("MBTI_INFERENCE_WORKERS", 4)
+INFERENCE_QUEUE = _env_int("MBTI_INFERENCE_QUEUE", 64)
+INFERENCE_TIMEOUT = _env_float("MBTI_INFERENCE_TIMEOUT", 10.0)
+RETRY_AFTER_SECONDS = _env_int("MBTI_RETRY_AFTER_SECONDS", 1)
+
+# Questionnaire sessions: store backend ("memory" or "package.module:ClassName"),
+# idle lifetime in seconds (0 disables expiry) and maximum live sessions
+SESSION_BACKEND = _env_str("MBTI_SESSION_BACKEND", "memory")
+SESSION_TTL = _env_float("MBTI_SESSION_TTL", 1800)
+SESSION_MAX = _env_int("MBTI_SESSION_MAX", 100_000)
+
+# Log every request and prediction (at debug level); off, the hot path builds
+# no log messages at all
+DEBUG_LOG = _env_bool("MBTI_DEBUG_LOG", False)
@@ -0,0 +1,58 @@
+"""
+Sentence encoder backends for the ML fallback
+
+- ``torch``: the full-precision PyTorch SentenceTransformer (the default)
+- ``onnx``: the same model exported to ONNX and run on ONNX Runtime's CPU provider
+- ``onnx-int8``: the ONNX model with dynamically int8-quantized weights
+
+All backends return embeddings from the same model, so the classifier in the
+trained bundle is used unchanged. The ONNX backends need the extra packages in
+``requirements-onnx.txt``; the quantized model is exported once and cached
+under ``cache_dir``.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def quantized_model_dir(cache_dir, model_name):
+    return os.path.join(cache_dir, model_name.replace("/", "--") + "-onnx")
+
+
+def _load_quantized(model_name, cache_dir, quantization):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    target = quantized_model_dir(cache_dir, model_name)
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not os.path.isfile(os.path.join(target, file_name)):
+        logger.info(f"Exporting int8 ({quantization}) ONNX model for {model_name} to {target}...")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(target)
+        export_dynamic_quantized_onnx_model(model, quantization, target)
+    return SentenceTransformer(target, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def load_encoder(model_name, backend="torch", cache_dir="artifacts/encoders", quantization="avx2"):
+    """
+    Load ``model_name`` with the requested backend
+
+    ``quantization`` is the ONNX Runtime dynamic quantization config used by
+    ``onnx-int8`` ("arm64", "avx2", "avx512" or "avx512_vnni").
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {BACKENDS}")
+
+    logger.info(f"Loading SentenceTransformer model ({backend} backend)...")
+    if backend == "onnx-int8":
+        encoder = _load_quantized(model_name, cache_dir, quantization)
+    else:
+        from sentence_transformers import SentenceTransformer
+
+        # Releases before the ONNX backend existed do not accept ``backend``
+        options = {"backend": "onnx"} if backend == "onnx" else {}
+        encoder = SentenceTransformer(model_name, **options)
+    logger.info("SentenceTransformer model loaded")
+    return encoder
@@ -0,0 +1,131 @@
+"""
+Dedicated, bounded executor for CPU-bound inference work
+
+Model work runs on its own thread pool instead of the shared anyio pool, so a
+burst of ML fallbacks cannot starve cheap endpoints. Admission is bounded:
+once ``max_workers + max_queue`` calls are in flight new calls are rejected
+with ``Overloaded`` rather than queued without limit, and callers stop
+waiting after ``timeout`` seconds. Long-lived callers such as a streamed batch
+``acquire()`` one slot up front and hold it until they ``release()`` it.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """
+    Raised when the executor's queue is full
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Thread pool with bounded admission and per-call timeouts
+
+    All methods are called from the event loop thread.
+    """
+
+    def __init__(self, max_workers, max_queue, timeout=None, retry_after=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout or None
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._pool = None
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.max_queue
+
+    @property
+    def saturated(self):
+        return self.in_flight >= self.capacity
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            logger.info(f"Inference executor started ({self.max_workers} workers, queue of {self.max_queue})")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def acquire(self):
+        """
+        Take one slot for a caller that runs work over time, or raise ``Overloaded``
+        """
+        if self.saturated:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+    def _track(self, work, loop):
+        self.in_flight += 1
+        # Released when the work itself finishes, not when the caller gives up,
+        # so timed-out calls still count against capacity while they run
+        work.add_done_callback(lambda future: loop.call_soon_threadsafe(self.release))
+
+    async def run(self, func, *args, admit=True, timeout=None):
+        """
+        Run ``func(*args)`` on the pool and return its result
+
+        With ``admit=True`` the call takes its own slot and is rejected with
+        ``Overloaded`` when the pool and its queue are full. ``admit=False``
+        runs it under a slot the caller already holds (see ``acquire``); if
+        the caller stops waiting, the abandoned work takes a slot of its own
+        until it finishes. Raises ``asyncio.TimeoutError`` after ``timeout``
+        seconds (the executor default when None).
+        """
+        if admit and self.saturated:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.start()
+
+        loop = asyncio.get_running_loop()
+        work = self._pool.submit(func, *args)
+        if admit:
+            self._track(work, loop)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(work), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            if not admit:
+                self._track(work, loop)
+            raise
+        except asyncio.CancelledError:
+            if not admit:
+                self._track(work, loop)
+            raise
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+inference = InferenceExecutor(
+    config.INFERENCE_WORKERS,
+    config.INFERENCE_QUEUE,
+    timeout=config.INFERENCE_TIMEOUT,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
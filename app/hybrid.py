@@ -0,0 +1,100 @@
+"""
+Hybrid probabilistic scoring: trait evidence blended with classifier probabilities
+
+The trait side reuses the adaptive engine's per-option log-likelihood ratios
+(see app.adaptive): the answers' summed log-odds give each axis a
+probability, and the log-probability of a type is the sum over its four
+letters. The classifier side comes from a table of ``clf.predict_proba`` over
+the embedding of every option text, built once per question bank and model,
+so no text is encoded per request. Each column of the table is centred on its
+mean over the bank's options, which cancels the training set's class balance
+and leaves how much an option favours each type compared with the others. A
+submission's classifier term is the sum of its options' rows, weighted by
+``ml_weight`` and added to the trait term before normalising over the 16
+types.
+
+Ties between letters that the trait scorer would settle with fixed
+tie-breakers are settled by the classifier instead, and the full
+distribution, per-letter probabilities and top-k types are returned.
+"""
+import numpy as np
+
+from app.preprocess import pool_single
+from app.scoring import MBTI_TYPES, TIE_BREAKERS, TRAITS
+
+# 1 where a type has a letter; columns are the first letters of the four axes
+# (E, S, T, J), then the second letters (I, N, F, P)
+LETTERS = TRAITS[0::2] + TRAITS[1::2]
+TYPE_LETTERS = np.array([[float(letter in mbti) for letter in LETTERS] for mbti in MBTI_TYPES])
+# The same with columns in TRAITS order, for reporting per-letter probabilities
+TYPE_TRAITS = np.array([[float(trait in mbti) for trait in TRAITS] for mbti in MBTI_TYPES])
+
+# Types ordered so equally likely types rank like the trait scorer's tie-breakers
+TIE_ORDER = sorted(range(len(MBTI_TYPES)), key=lambda i: -sum(a == b for a, b in zip(MBTI_TYPES[i], TIE_BREAKERS)))
+
+# Floor on classifier probabilities so one option cannot rule a type out
+MIN_PROBABILITY = 1e-4
+
+
+def option_log_probs(encoder, classifier, classes, pooling, option_texts):
+    """
+    Centred classifier log-probability of each MBTI type (MBTI_TYPES order) for every option text
+
+    Returns an array of shape (n_options + 1, 16); the trailing all-zero row
+    matches TraitScorer.null_row so unknown answers add nothing. Types the
+    classifier never saw get the floor probability.
+    """
+    embeddings = np.asarray(encoder.encode(list(option_texts)))
+    probs = classifier.predict_proba(pool_single(embeddings, pooling))
+
+    columns = [MBTI_TYPES.index(str(mbti)) for mbti in np.asarray(classes)[classifier.classes_]]
+    table = np.full((len(option_texts), len(MBTI_TYPES)), MIN_PROBABILITY)
+    table[:, columns] = np.maximum(probs, MIN_PROBABILITY)
+    log_probs = np.log(table / table.sum(axis=1, keepdims=True))
+    log_probs -= log_probs.mean(axis=0)
+    return np.vstack([log_probs, np.zeros(len(MBTI_TYPES))])
+
+
+class HybridScorer:
+    """
+    16-type distributions from answered option rows
+
+    The adaptive engine's per-axis weights and the weighted classifier table
+    are stacked into one per-option table, so a submission costs a single
+    gather-and-sum over its rows plus a few operations on 20 numbers.
+    """
+
+    def __init__(self, engine, log_probs=None, ml_weight=1.0):
+        self.uses_ml = log_probs is not None and ml_weight > 0
+        self.n_axes = engine.weights.shape[1]
+        self.table = np.hstack([engine.weights, ml_weight * log_probs]) if self.uses_ml else engine.weights
+
+    def distribution(self, rows):
+        """
+        Probability of each type in MBTI_TYPES order
+        """
+        totals = self.table.take(rows, axis=0).sum(axis=0) if len(rows) else np.zeros(self.table.shape[1])
+        logodds = totals[:self.n_axes]
+        # log P(letter) = log sigmoid(+-logodds), summed over each type's letters
+        logits = TYPE_LETTERS @ -np.logaddexp(0.0, np.concatenate((-logodds, logodds)))
+        if self.uses_ml:
+            logits += totals[self.n_axes:]
+        probs = np.exp(logits - logits.max())
+        return probs / probs.sum()
+
+
+def describe(probs, top_k):
+    """
+    JSON-ready summary of a type distribution: top-k, confidence, letters, full distribution
+    """
+    n_types = len(MBTI_TYPES)
+    rounded = np.round(np.concatenate((probs, probs @ TYPE_TRAITS)), 4).tolist()
+    # sorted() is stable, so equally likely types keep the tie-breaker order
+    order = sorted(TIE_ORDER, key=rounded.__getitem__, reverse=True)[:top_k]
+    return {
+        "mbti": MBTI_TYPES[order[0]],
+        "confidence": rounded[order[0]],
+        "top": [{"mbti": MBTI_TYPES[i], "probability": rounded[i]} for i in order],
+        "dimensions": dict(zip(TRAITS, rounded[n_types:])),
+        "distribution": dict(zip(MBTI_TYPES, rounded[:n_types])),
+    }
@@ -1,11 +1,30 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from app.model import predict_personality
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from app import assets, config
+from app.adaptive import AXES
+from app.executor import Overloaded, inference
+from app.metrics import PREDICTIONS, REGISTRY, STAGE_SECONDS, MetricsMiddleware
+from app.model import (
+    cache_stats,
+    encode_batcher,
+    explain,
+    ml_fallback,
+    predict_personality,
+    predict_personality_batch,
+    predict_personality_by_ml_async,
+    predict_personality_hybrid,
+)
+from app.questions import etag_matches, question_bank
+from app.schemas import Answers
+from app.sessions import SessionError, StaleSession, session_store
+import asyncio
 import json
 import logging
 import sys
+from contextlib import asynccontextmanager
+from typing import Literal
 
 # Configure logging to output to stdout
 logging.basicConfig(
@@ -18,272 +37,346 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
-class Answers(BaseModel):
-    responses: list[str]
-
-@app.get("/", response_class=HTMLResponse)
-def home():
-    logger.info("Serving web interface")
-    return """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>MBTI Personality Test</title>
-        <style>
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: #f5f5f5;
-                line-height: 1.6;
-            }
-            .container {
-                background: white;
-                padding: 30px;
-                border-radius: 10px;
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            }
-            h1 {
-                color: #333;
-                text-align: center;
-                margin-bottom: 30px;
-            }
-            .question {
-                margin-bottom: 25px;
-                padding: 20px;
-                background: #f9f9f9;
-                border-radius: 8px;
-                border-left: 4px solid #007bff;
-            }
-            .question h3 {
-                margin-top: 0;
-                color: #333;
-            }
-            .options {
-                margin-top: 15px;
-            }
-            .option {
-                margin: 10px 0;
-                padding: 10px;
-                background: white;
-                border: 2px solid #e0e0e0;
-                border-radius: 5px;
-                cursor: pointer;
-                transition: all 0.3s ease;
-            }
-            .option:hover {
-                border-color: #007bff;
-                background: #f0f8ff;
-            }
-            .option.selected {
-                border-color: #007bff;
-                background: #007bff;
-                color: white;
-            }
-            .option input[type="radio"] {
-                margin-right: 10px;
-            }
-            button {
-                background: #007bff;
-                color: white;
-                padding: 12px 30px;
-                border: none;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 16px;
-                margin-top: 20px;
-                width: 100%;
-                transition: background 0.3s ease;
-            }
-            button:hover {
-                background: #0056b3;
-            }
-            button:disabled {
-                background: #ccc;
-                cursor: not-allowed;
-            }
-            .result {
-                margin-top: 30px;
-                padding: 20px;
-                background: #e8f5e8;
-                border-radius: 8px;
-                border-left: 4px solid #28a745;
-            }
-            .result h2 {
-                color: #155724;
-                margin-top: 0;
-            }
-            .loading {
-                text-align: center;
-                padding: 20px;
-            }
-            .progress {
-                background: #e0e0e0;
-                border-radius: 10px;
-                height: 10px;
-                margin: 20px 0;
-            }
-            .progress-bar {
-                background: #007bff;
-                height: 100%;
-                border-radius: 10px;
-                transition: width 0.3s ease;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>MBTI Personality Test</h1>
-            <div class="progress">
-                <div class="progress-bar" id="progressBar" style="width: 0%"></div>
-            </div>
-            <div id="questionnaire"></div>
-            <button id="submitBtn" onclick="submitAnswers()" disabled>Get My Personality Type</button>
-            <div id="result" class="result" style="display: none;"></div>
-        </div>
-
-        <script>
-            let questions = [];
-            let answers = [];
-            let currentQuestion = 0;
-
-            async function loadQuestions() {
-                try {
-                    const response = await fetch('/questions');
-                    questions = await response.json();
-                    displayQuestions();
-                } catch (error) {
-                    console.error('Error loading questions:', error);
-                }
-            }
-
-            function displayQuestions() {
-                const questionnaire = document.getElementById('questionnaire');
-                questionnaire.innerHTML = '';
-                
-                questions.forEach((q, index) => {
-                    const questionDiv = document.createElement('div');
-                    questionDiv.className = 'question';
-                    questionDiv.innerHTML = `
-                        <h3>Question ${index + 1}</h3>
-                        <p>${q.question}</p>
-                        <div class="options">
-                            ${q.options.map((option, optIndex) => `
-                                <div class="option" onclick="selectOption(${index}, ${optIndex}, '${option.text}')">
-                                    <input type="radio" name="q${index}" value="${option.text}" id="q${index}_${optIndex}">
-                                    <label for="q${index}_${optIndex}">${option.text}</label>
-                                </div>
-                            `).join('')}
-                        </div>
-                    `;
-                    questionnaire.appendChild(questionDiv);
-                });
-            }
-
-            function selectOption(questionIndex, optionIndex, text) {
-                // Remove previous selection
-                const questionDiv = document.querySelectorAll('.question')[questionIndex];
-                questionDiv.querySelectorAll('.option').forEach(opt => opt.classList.remove('selected'));
-                
-                // Add selection to clicked option
-                const selectedOption = questionDiv.querySelectorAll('.option')[optionIndex];
-                selectedOption.classList.add('selected');
-                selectedOption.querySelector('input').checked = true;
-                
-                // Store answer
-                answers[questionIndex] = text;
-                
-                // Update progress
-                const progress = (answers.filter(a => a).length / questions.length) * 100;
-                document.getElementById('progressBar').style.width = progress + '%';
-                
-                // Enable submit button if all questions answered
-                if (answers.filter(a => a).length === questions.length) {
-                    document.getElementById('submitBtn').disabled = false;
-                }
-            }
-
-            async function submitAnswers() {
-                const submitBtn = document.getElementById('submitBtn');
-                submitBtn.disabled = true;
-                submitBtn.textContent = 'Analyzing...';
-                
-                try {
-                    const response = await fetch('/predict', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            responses: answers.filter(a => a)
-                        })
-                    });
-                    
-                    const result = await response.json();
-                    displayResult(result);
-                } catch (error) {
-                    console.error('Error getting prediction:', error);
-                    alert('Error getting prediction. Please try again.');
-                } finally {
-                    submitBtn.disabled = false;
-                    submitBtn.textContent = 'Get My Personality Type';
-                }
-            }
-
-            function displayResult(result) {
-                const resultDiv = document.getElementById('result');
-                resultDiv.innerHTML = `
-                    <h2>Your Personality Type: ${result.mbti}</h2>
-                    <p>${result.explanation}</p>
-                    <button onclick="restartTest()" style="width: auto; margin-top: 15px;">Take Test Again</button>
-                `;
-                resultDiv.style.display = 'block';
-                resultDiv.scrollIntoView({ behavior: 'smooth' });
-            }
-
-            function restartTest() {
-                answers = [];
-                document.getElementById('result').style.display = 'none';
-                document.getElementById('submitBtn').disabled = true;
-                document.getElementById('progressBar').style.width = '0%';
-                
-                // Clear all selections
-                document.querySelectorAll('.option').forEach(opt => {
-                    opt.classList.remove('selected');
-                    opt.querySelector('input').checked = false;
-                });
-            }
-
-            // Load questions when page loads
-            loadQuestions();
-        </script>
-    </body>
-    </html>
+@asynccontextmanager
+async def lifespan(app):
     """
+    Start background services; only cheap work happens before serving
 
-@app.get("/questions")
-def get_questions():
-    logger.info("Questions endpoint called")
-    with open("app/questions.json", "r") as f:
-        questions = json.load(f)
-    return questions
-
-@app.post("/predict")
-def predict(data: Answers):
-    logger.info(f"Prediction request received with {len(data.responses)} responses")
-    mbti_type, explanation = predict_personality(data.responses)
-    logger.info(f"Prediction completed: {mbti_type}")
-    return {"mbti": mbti_type, "explanation": explanation}
-
-@app.on_event("startup")
-async def startup_event():
+    The ML fallback warms up on its own thread, so /healthz and trait-based
+    predictions are available immediately and /readyz turns ready once the
+    model is loaded (or has failed to load and keeps retrying).
+    """
     logger.info("MBTI Predictor application starting up...")
-
-@app.on_event("shutdown")
-async def shutdown_event():
+    question_bank.start_watching(config.QUESTIONS_POLL_SECONDS)
+    inference.start()
+    if config.ML_MICROBATCH:
+        await encode_batcher.start()
+    if config.PRELOAD_ML:
+        ml_fallback.start_warmup()
+    yield
     logger.info("MBTI Predictor application shutting down...")
+    await encode_batcher.stop()
+    question_bank.stop_watching()
+    inference.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# The web UI is served from precompressed, content-hashed files (see app.assets);
+# build them here if the image was not built with `python -m app.assets`
+if assets.ensure_built():
+    logger.info("Static assets were missing or stale and have been rebuilt")
+
+# /predict parses its body itself so parsing can be timed; this keeps the
+# request schema in the OpenAPI docs
+ANSWERS_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": Answers.model_json_schema()}},
+    }
+}
+
+def parse_answers(body):
+    """
+    Validate a JSON request body, raising the same 422 error FastAPI would
+    """
+    try:
+        return Answers.model_validate_json(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        for error in errors:
+            error["loc"] = ("body",) + tuple(error["loc"])
+        raise RequestValidationError(errors, body=body)
+
+@REGISTRY.add_collector
+def runtime_metrics():
+    """
+    Cache, inference pool and model state reported on /metrics
+    """
+    caches = cache_stats()
+    pool = inference.stats()
+
+    def per_cache(field):
+        return [({"cache": name}, stats[field]) for name, stats in caches.items()]
+
+    return [
+        ("mbti_cache_hits_total", "counter", "Cache hits", per_cache("hits")),
+        ("mbti_cache_misses_total", "counter", "Cache misses", per_cache("misses")),
+        ("mbti_cache_evictions_total", "counter", "Cache evictions", per_cache("evictions")),
+        ("mbti_cache_entries", "gauge", "Entries currently cached", per_cache("entries")),
+        ("mbti_cache_bytes", "gauge", "Approximate bytes currently cached", per_cache("bytes")),
+        ("mbti_inference_in_flight", "gauge", "Inference calls running or queued", [({}, pool["in_flight"])]),
+        ("mbti_inference_capacity", "gauge", "Inference calls admitted before rejecting", [({}, pool["capacity"])]),
+        ("mbti_inference_rejected_total", "counter", "Inference calls rejected with 503", [({}, pool["rejected"])]),
+        ("mbti_inference_timed_out_total", "counter", "Inference calls that timed out", [({}, pool["timed_out"])]),
+        ("mbti_ml_loaded", "gauge", "Whether the ML fallback model is loaded", [({}, int(ml_fallback.loaded))]),
+        ("mbti_sessions", "gauge", "Live questionnaire sessions", [({}, session_store.stats().get("sessions", 0))]),
+    ]
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(
+        {"detail": "Server is busy, please retry shortly"},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(asyncio.TimeoutError)
+async def timeout_handler(request: Request, exc: asyncio.TimeoutError):
+    logger.warning(f"Timed out serving {request.url.path}")
+    return JSONResponse({"detail": "Prediction timed out"}, status_code=504)
+
+@app.get("/questions")
+async def get_questions(request: Request):
+    if config.DEBUG_LOG:
+        logger.debug("Questions endpoint called")
+    bank = question_bank.current
+    headers = {"ETag": bank.etag, "Cache-Control": f"public, max-age={config.QUESTIONS_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), bank.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(bank.body, media_type="application/json", headers=headers)
+
+@app.post("/predict", openapi_extra=ANSWERS_BODY)
+async def predict(
+    request: Request,
+    mode: Literal["traits", "hybrid"] = "traits",
+    top_k: int = Query(3, ge=1, le=16),
+):
+    body = await request.body()
+    with STAGE_SECONDS.time(stage="parse"):
+        data = parse_answers(body)
+    if config.DEBUG_LOG:
+        logger.debug(f"Prediction request received with {len(data.responses)} responses")
+    if mode == "hybrid":
+        # Resolved once, without building: with this bank's option table in
+        # place scoring is table lookups and runs inline, while building the
+        # table encodes every option and uses the pool
+        bank = question_bank.current
+        scorer = ml_fallback.built_hybrid_scorer(bank)
+        if scorer is not None:
+            result = predict_personality_hybrid(data.responses, top_k, bank, scorer)
+        else:
+            result = await inference.run(predict_personality_hybrid, data.responses, top_k)
+        with STAGE_SECONDS.time(stage="serialize"):
+            return JSONResponse(result)
+    result = await inference.run(predict_personality, data.responses, False)
+    if result is None:
+        # The ML fallback awaits the micro-batcher here rather than parking an
+        # inference thread, so concurrent fallbacks coalesce into one batch
+        if encode_batcher.running:
+            result = await asyncio.wait_for(predict_personality_by_ml_async(data.responses), inference.timeout)
+        else:
+            result = await inference.run(predict_personality, data.responses)
+    mbti_type, explanation = result
+    if config.DEBUG_LOG:
+        logger.debug(f"Prediction completed: {mbti_type}")
+    with STAGE_SECONDS.time(stage="serialize"):
+        return JSONResponse({"mbti": mbti_type, "explanation": explanation})
+
+class SessionAnswer(BaseModel):
+    question_id: int
+    option: int
+
+def get_session(session_id):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/session", status_code=201)
+async def create_session():
+    session = session_store.create(question_bank.current)
+    return {"id": session.id, "questions": session.n_questions}
+
+@app.post("/session/{session_id}/answer")
+async def answer_session(session_id: str, data: SessionAnswer):
+    session = get_session(session_id)
+    try:
+        session.answer(question_bank.current, data.question_id, data.option)
+    except StaleSession as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SessionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    session_store.save(session)
+    return {"answered": session.answered, "remaining": session.n_questions - session.answered}
+
+@app.get("/session/{session_id}/next")
+async def session_next(session_id: str):
+    """
+    The most informative question to ask next, or done once every axis is decided
+    """
+    session = get_session(session_id)
+    bank = question_bank.current
+    if bank.etag != session.etag:
+        raise HTTPException(status_code=409, detail="The question bank changed since this session started")
+    engine = bank.adaptive
+    with STAGE_SECONDS.time(stage="adaptive_select"):
+        logodds = engine.evidence(session.rows.values())
+        position = engine.next_question(logodds, engine.asked_mask(session.rows))
+    confidence = engine.confidence(logodds)
+    return {
+        "done": position is None,
+        "question": None if position is None else bank.questions[position],
+        "answered": session.answered,
+        "mbti": engine.mbti_type(logodds),
+        "confidence": {axis: round(float(c), 4) for axis, c in zip(AXES, confidence)},
+    }
+
+@app.get("/session/{session_id}/result")
+async def session_result(session_id: str):
+    session = get_session(session_id)
+    mbti_type = session.mbti_type()
+    PREDICTIONS.inc(method="session")
+    return {
+        "mbti": mbti_type,
+        "explanation": explain(mbti_type),
+        "answered": session.answered,
+        "complete": session.complete,
+    }
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Ready once the ML fallback is loaded (or immediately when it loads lazily)
+
+    The fallback is optional: once a warm-up attempt has failed the server
+    reports ready with ``"ml": false`` while it retries in the background,
+    since trait-based predictions do not need it.
+    """
+    if ml_fallback.loaded or not config.PRELOAD_ML:
+        return {"status": "ready", "ml": ml_fallback.loaded}
+    if ml_fallback.error is not None:
+        return {"status": "ready", "ml": False, "ml_error": str(ml_fallback.error)}
+    return JSONResponse({"status": "warming up"}, status_code=503)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    NDJSON response streamed while the request body is still being read
+
+    Starlette's StreamingResponse listens for disconnects by consuming
+    ``receive``, which would steal the unread request body chunks.
+    ``on_close`` runs once the response is finished or abandoned.
+    """
+    media_type = "application/x-ndjson"
+
+    def __init__(self, content, on_close=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+        if self.background is not None:
+            await self.background()
+
+async def iter_ndjson_lines(request, max_line_bytes):
+    """
+    Yield non-empty lines of the request body as it arrives
+
+    A line longer than ``max_line_bytes`` is dropped as it streams in, never
+    buffered whole, and yielded as None.
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if oversized or len(line) > max_line_bytes:
+                # The first line after an overflow is the rest of the oversized one
+                oversized = False
+                yield None
+            elif line.strip():
+                yield line
+        if len(buffer) > max_line_bytes:
+            oversized = True
+            buffer = b""
+    if oversized:
+        yield None
+    elif buffer.strip():
+        yield buffer
+
+async def score_ndjson(request):
+    """
+    Score NDJSON submissions in fixed-size chunks and yield NDJSON result lines
+    """
+    pending = []
+    scored = 0
+
+    async def flush():
+        # Runs under the slot predict_batch holds; chunks must not be rejected mid-stream
+        try:
+            results = await inference.run(
+                predict_personality_batch, [responses for _, responses in pending], admit=False
+            )
+        except asyncio.TimeoutError:
+            # The 200 status is already sent, so the chunk fails line by line
+            logger.warning(f"Timed out scoring a batch chunk of {len(pending)} lines")
+            return "".join(json.dumps({"index": i, "error": "prediction timed out"}) + "\n" for i, _ in pending)
+        with STAGE_SECONDS.time(stage="serialize"):
+            return "".join(
+                json.dumps({"index": i, "mbti": mbti_type, "explanation": explanation}) + "\n"
+                for (i, _), (mbti_type, explanation) in zip(pending, results)
+            )
+
+    index = -1
+    max_line_bytes = config.BATCH_MAX_LINE_BYTES
+    async for index, line in aenumerate(iter_ndjson_lines(request, max_line_bytes)):
+        try:
+            if line is None:
+                raise ValueError(f"line is longer than {max_line_bytes} bytes")
+            with STAGE_SECONDS.time(stage="parse"):
+                pending.append((index, Answers.model_validate_json(line).responses))
+        except ValueError as e:  # pydantic's ValidationError is a ValueError
+            # Flush what was queued before the bad line so output stays in input order
+            if pending:
+                yield await flush()
+                scored += len(pending)
+                pending = []
+            if isinstance(e, ValidationError):
+                error = e.errors(include_url=False, include_input=False, include_context=False)
+            else:
+                error = str(e)
+            yield json.dumps({"index": index, "error": error}) + "\n"
+            continue
+
+        if len(pending) >= config.BATCH_CHUNK_SIZE:
+            yield await flush()
+            scored += len(pending)
+            pending = []
+
+    if pending:
+        yield await flush()
+        scored += len(pending)
+    if config.DEBUG_LOG:
+        logger.debug(f"Batch prediction completed: {index + 1} lines, {scored} scored")
+
+async def aenumerate(iterable):
+    index = 0
+    async for item in iterable:
+        yield index, item
+        index += 1
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    if config.DEBUG_LOG:
+        logger.debug("Batch prediction request received")
+    # One inference slot is held for the life of the stream, so concurrent
+    # batches count against the same bound as single predictions
+    inference.acquire()
+    return NDJSONStreamingResponse(score_ndjson(request), on_close=inference.release)
+
+# Mounted last so every API route above takes precedence; serves index.html at /
+app.mount("/", assets.PrecompressedStaticFiles(directory=assets.DIST_DIR, html=True), name="ui")
@@ -1,10 +1,20 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import LabelEncoder
+import hashlib
 import logging
+import os
 import sys
-import json
+import threading
+import time
+
+import numpy as np
+
+from app import config
+from app.batching import MicroBatcher
+from app.cache import LRUCache
+from app.hybrid import HybridScorer, describe, option_log_probs
+from app.metrics import PREDICTIONS, STAGE_SECONDS
+from app.preprocess import pool_single
+from app.questions import question_bank
+from app.scoring import TRAITS
 
 # Configure logging
 logging.basicConfig(
@@ -17,31 +27,22 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Load model and data once for fallback ML prediction
-logger.info("Loading MBTI dataset...")
-df = pd.read_csv("data/mbti_1.csv")
-logger.info(f"Dataset loaded with {len(df)} rows")
-
-logger.info("Loading SentenceTransformer model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-logger.info("SentenceTransformer model loaded")
+# Per-request log lines are only built when MBTI_DEBUG_LOG is set
+if config.DEBUG_LOG:
+    logging.getLogger("app").setLevel(logging.DEBUG)
 
-logger.info("Encoding posts...")
-X = model.encode(df["posts"].tolist())
-y = LabelEncoder().fit_transform(df["type"])
-logger.info("Posts encoded")
-
-logger.info("Training classifier...")
-clf = LogisticRegression(max_iter=1000)
-clf.fit(X, y)
-logger.info("Classifier trained")
-
-types = df["type"].unique()
-logger.info(f"Available MBTI types: {types}")
+# Final results keyed on the question bank ETag and the canonical answer hash,
+# and ML fallback embeddings keyed on the hash of the encoded text
+result_cache = LRUCache(config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL)
+embedding_cache = LRUCache(
+    config.EMBEDDING_CACHE_SIZE,
+    ttl=config.EMBEDDING_CACHE_TTL,
+    max_bytes=config.EMBEDDING_CACHE_BYTES,
+)
 
-# Load questions for trait mapping
-with open("app/questions.json", "r") as f:
-    questions = json.load(f)
+# Seconds before the first retry of a failed ML warm-up, doubled up to the cap
+WARMUP_RETRY_SECONDS = 5.0
+WARMUP_MAX_RETRY_SECONDS = 300.0
 
 # Predefined explanations for each MBTI type
 MBTI_EXPLANATIONS = {
@@ -63,97 +64,411 @@ MBTI_EXPLANATIONS = {
     "ENTJ": "You are frank, decisive, assume leadership readily. You quickly see illogical and inefficient procedures and policies, develop and implement comprehensive systems to solve organizational problems."
 }
 
-def predict_personality_by_traits(answers):
+def predict_personality_by_traits(answers, bank=None):
     """
     Predict MBTI personality type based on trait scoring from questionnaire answers
+
+    Answers are positional and may be either the option text or the option index.
     """
-    # Initialize trait scores
-    trait_scores = {'E': 0, 'I': 0, 'S': 0, 'N': 0, 'T': 0, 'F': 0, 'J': 0, 'P': 0}
-    
-    # Score each answer based on the trait mapping in questions
-    for i, answer in enumerate(answers):
-        if i < len(questions):
-            question = questions[i]
-            for option in question['options']:
-                if option['text'] == answer:
-                    trait = option['trait']
-                    if trait != 'X':  # Ignore neutral answers
-                        trait_scores[trait] += 1
-                    break
-    
-    # Determine MBTI type based on highest scores in each dimension
-    mbti_type = ""
-    
-    # Extraversion vs Introversion
-    if trait_scores['E'] > trait_scores['I']:
-        mbti_type += 'E'
-    elif trait_scores['I'] > trait_scores['E']:
-        mbti_type += 'I'
-    else:
-        # Tie-breaker: default to I (more common in dataset)
-        mbti_type += 'I'
-    
-    # Sensing vs Intuition
-    if trait_scores['S'] > trait_scores['N']:
-        mbti_type += 'S'
-    elif trait_scores['N'] > trait_scores['S']:
-        mbti_type += 'N'
-    else:
-        # Tie-breaker: default to N (more common in dataset)
-        mbti_type += 'N'
-    
-    # Thinking vs Feeling
-    if trait_scores['T'] > trait_scores['F']:
-        mbti_type += 'T'
-    elif trait_scores['F'] > trait_scores['T']:
-        mbti_type += 'F'
-    else:
-        # Tie-breaker: default to F (slightly more common)
-        mbti_type += 'F'
-    
-    # Judging vs Perceiving
-    if trait_scores['J'] > trait_scores['P']:
-        mbti_type += 'J'
-    elif trait_scores['P'] > trait_scores['J']:
-        mbti_type += 'P'
-    else:
-        # Tie-breaker: default to P (more common in dataset)
-        mbti_type += 'P'
-    
-    logger.info(f"Trait scores: {trait_scores}")
-    logger.info(f"Determined MBTI type: {mbti_type}")
-    
+    scorer = (bank or question_bank.current).scorer
+    with STAGE_SECONDS.time(stage="trait_scoring"):
+        rows = scorer.option_rows(answers)
+        mbti_type = scorer.lookup_type(rows)
+        if mbti_type is None:
+            mbti_type, trait_counts = scorer.score_rows(rows)
+            if config.DEBUG_LOG:
+                logger.debug(f"Trait scores: {dict(zip(TRAITS, trait_counts.tolist()))}")
+
+    if config.DEBUG_LOG:
+        logger.debug(f"Determined MBTI type: {mbti_type}")
+
     return mbti_type
 
-def predict_personality_by_ml(answers):
+class MLFallback:
+    """
+    Lazily loaded, thread-safe SentenceTransformer encoder and classifier
+
+    Nothing heavy is imported or loaded until the first call to ``load()``;
+    after that only the encoder, the fitted classifier and the label classes
+    stay resident, never the training DataFrame or embedding matrix. The
+    encoder runs on ``backend`` (see app.encoders).
+    """
+
+    def __init__(self, data_path, artifact_dir, model_name, mmap=True, backend="torch", quantization="avx2"):
+        self.data_path = data_path
+        self.artifact_dir = artifact_dir
+        self.model_name = model_name
+        self.mmap = mmap
+        self.backend = backend
+        self.quantization = quantization
+        self.encoder = None
+        self.classifier = None
+        self.classes = None
+        self.pooling = "none"
+        self.error = None
+        self._lock = threading.Lock()
+        self._warmup = None
+        # ((question bank ETag, model loaded), HybridScorer)
+        self._hybrid = None
+        self._hybrid_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.classifier is not None
+
+    def load(self, build_hybrid=True):
+        """
+        Load the encoder and classifier, then build the hybrid option table
+
+        ``build_hybrid=False`` skips the option table, which encodes every
+        option text: a pre-fork parent must not run the encoder, since torch
+        thread pools started there do not survive the fork. A later ``load()``
+        in the forked worker builds it.
+        """
+        if not self.loaded:
+            self._load_model()
+        if build_hybrid and not self.hybrid_ready(question_bank.current):
+            try:
+                self.hybrid_scorer(question_bank.current)
+            except Exception as e:
+                logger.warning(f"Could not build the hybrid option table: {e}")
+        return self
+
+    def _load_model(self):
+        with self._lock:
+            if not self.loaded:
+                from app.artifacts import load_or_train
+                from app.encoders import load_encoder
+
+                encoder = load_encoder(
+                    self.model_name,
+                    self.backend,
+                    cache_dir=os.path.join(self.artifact_dir, "encoders"),
+                    quantization=self.quantization,
+                )
+
+                # Bundles are always trained on torch embeddings, which every
+                # backend serves; a classifier fitted on another backend's
+                # (e.g. int8) embeddings would be saved under the same id
+                bundle = load_or_train(
+                    self.data_path, self.artifact_dir, self.model_name,
+                    encoder=encoder if self.backend == "torch" else None, mmap=self.mmap,
+                    pooling=config.TRAIN_POOLING, classifier=config.TRAIN_CLASSIFIER,
+                )
+                self.encoder = encoder
+                self.classes = bundle["classes"]
+                self.pooling = bundle["meta"].get("pooling", "none")
+                # Assigned last: other threads treat a classifier as "ready"
+                self.classifier = bundle["classifier"]
+                logger.info(f"Available MBTI types: {self.classes}")
+
+    def start_warmup(self):
+        """
+        Load in a background thread so trait-based requests are served meanwhile
+
+        After a pre-fork load only the hybrid option table is left to build.
+        """
+        if (self.loaded and self.hybrid_ready(question_bank.current)) or self._warmup is not None:
+            return
+        self._warmup = threading.Thread(target=self._warm, name="ml-warmup", daemon=True)
+        self._warmup.start()
+
+    def _warm(self):
+        """
+        Load until it succeeds, retrying with exponential backoff after failures
+        """
+        start = time.perf_counter()
+        delay = WARMUP_RETRY_SECONDS
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                self.error = e
+                logger.warning(f"ML fallback warm-up failed: {e}, retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
+            else:
+                self.error = None
+                logger.info(f"ML fallback warmed up in {time.perf_counter() - start:.1f}s")
+                return
+
+    def encode(self, texts):
+        if not self.loaded:
+            self.load()
+        with STAGE_SECONDS.time(stage="ml_encode"):
+            return self.encoder.encode(texts)
+
+    def classify(self, embeddings):
+        if not self.loaded:
+            self.load()
+        with STAGE_SECONDS.time(stage="ml_classify"):
+            return self.classes[self.classifier.predict(pool_single(embeddings, self.pooling))]
+
+    def predict(self, texts):
+        return self.classify(self.encode(texts))
+
+    def built_hybrid_scorer(self, bank):
+        """
+        The HybridScorer ``hybrid_scorer(bank)`` would return if it is already built, else None
+
+        Never builds or waits on a lock, so it is safe on the event loop.
+        """
+        cached = self._hybrid
+        if cached is not None and cached[0] == (bank.etag, self.loaded):
+            return cached[1]
+        return None
+
+    def hybrid_ready(self, bank):
+        """
+        Whether ``hybrid_scorer(bank)`` returns without building anything
+        """
+        return self.built_hybrid_scorer(bank) is not None
+
+    def hybrid_scorer(self, bank):
+        """
+        HybridScorer for ``bank``, built once per bank version and model state
+
+        Before the model is loaded it scores from trait evidence alone; once
+        loaded, every option text is encoded and classified once into the
+        option table.
+        """
+        key = (bank.etag, self.loaded)
+        cached = self._hybrid
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with self._hybrid_lock:
+            cached = self._hybrid
+            if cached is None or cached[0] != key:
+                log_probs = None
+                if key[1]:
+                    start = time.perf_counter()
+                    log_probs = option_log_probs(
+                        self.encoder, self.classifier, self.classes, self.pooling, bank.scorer.option_texts
+                    )
+                    logger.info(f"Built hybrid option table for {len(log_probs) - 1} options "
+                                f"in {time.perf_counter() - start:.2f}s")
+                cached = self._hybrid = (key, HybridScorer(bank.adaptive, log_probs, config.HYBRID_ML_WEIGHT))
+        return cached[1]
+
+
+ml_fallback = MLFallback(
+    config.DATA_PATH,
+    config.ARTIFACT_DIR,
+    config.EMBEDDING_MODEL,
+    mmap=config.MMAP_ARTIFACTS,
+    backend=config.ENCODER_BACKEND,
+    quantization=config.ONNX_QUANTIZATION,
+)
+
+# Single ML fallback requests are coalesced into batched encoder calls; the
+# server starts the batcher on its event loop (see app.main)
+encode_batcher = MicroBatcher(
+    ml_fallback.encode,
+    max_batch_size=config.ML_BATCH_SIZE,
+    max_delay=config.ML_BATCH_DELAY_MS / 1000,
+)
+
+
+def _text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def embed_texts(texts):
+    """
+    Embed texts through the embedding cache, encoding all misses in one call
+    """
+    keys = [_text_key(text) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    misses = [i for i, emb in enumerate(embeddings) if emb is None]
+    if misses:
+        encoded = ml_fallback.encode([texts[i] for i in misses])
+        for i, emb in zip(misses, encoded):
+            embedding_cache.set(keys[i], emb)
+            embeddings[i] = emb
+    return np.vstack(embeddings)
+
+async def embed_text_async(text):
+    """
+    Embedding of one text through the embedding cache, awaiting the micro-batcher
+
+    Called on the batcher's event loop, so waiting callers hold no thread and
+    any number of them can coalesce into one encoder call.
+    """
+    key = _text_key(text)
+    emb = embedding_cache.get(key)
+    if emb is None:
+        emb = await encode_batcher.submit(text)
+        embedding_cache.set(key, emb)
+    return emb
+
+def predict_personality_by_ml(answers, bank=None):
     """
     Fallback ML prediction based on sentence embeddings (original method)
     """
-    combined_input = " ".join(answers)
-    emb = model.encode([combined_input])
-    pred = clf.predict(emb)[0]
-    mbti = types[pred]
+    combined_input = " ".join((bank or question_bank.current).scorer.answer_texts(answers))
+    if encode_batcher.running:
+        key = _text_key(combined_input)
+        emb = embedding_cache.get(key)
+        if emb is None:
+            emb = encode_batcher.submit_threadsafe(combined_input)
+            embedding_cache.set(key, emb)
+        emb = emb.reshape(1, -1)
+    else:
+        emb = embed_texts([combined_input])
+    mbti = str(ml_fallback.classify(emb)[0])
     
-    logger.info(f"ML predicted MBTI type: {mbti}")
+    if config.DEBUG_LOG:
+        logger.debug(f"ML predicted MBTI type: {mbti}")
     return mbti
 
-def predict_personality(answers):
+def predict_personality_by_ml_batch(answer_sets, bank=None):
+    """
+    ML prediction for many submissions with a single encode and classifier call
+    """
+    scorer = (bank or question_bank.current).scorer
+    combined_inputs = [" ".join(scorer.answer_texts(answers)) for answers in answer_sets]
+    return [str(mbti) for mbti in ml_fallback.classify(embed_texts(combined_inputs))]
+
+def explain(mbti_type):
+    """
+    Predefined explanation for an MBTI type
+    """
+    return MBTI_EXPLANATIONS.get(mbti_type, f"Based on your responses, you have been classified as {mbti_type} personality type.")
+
+def _record(key, mbti_type, method):
+    """
+    Explain, count and cache a fresh prediction
+    """
+    explanation = explain(mbti_type)
+    PREDICTIONS.inc(method=method)
+    if config.DEBUG_LOG:
+        logger.debug(f"Final prediction ({method}): {mbti_type}")
+    result_cache.set(key, (mbti_type, explanation))
+    return mbti_type, explanation
+
+def predict_personality(answers, ml=True):
     """
     Predict MBTI personality type using trait-based scoring with ML fallback
+
+    With ``ml=False`` a submission that needs the ML fallback returns None,
+    for async callers that run it with predict_personality_by_ml_async.
     """
-    logger.info(f"Predicting personality for {len(answers)} answers")
+    if config.DEBUG_LOG:
+        logger.debug(f"Predicting personality for {len(answers)} answers")
+
+    bank = question_bank.current
+    key = (bank.etag, bank.scorer.cache_key(answers))
+    cached = result_cache.get(key)
+    if cached is not None:
+        PREDICTIONS.inc(method="cached")
+        if config.DEBUG_LOG:
+            logger.debug(f"Final prediction (cached): {cached[0]}")
+        return cached
     
     # Primary method: trait-based scoring
     try:
-        mbti_type = predict_personality_by_traits(answers)
+        mbti_type = predict_personality_by_traits(answers, bank)
         method = "trait-based"
     except Exception as e:
         logger.warning(f"Trait-based prediction failed: {e}, falling back to ML")
-        mbti_type = predict_personality_by_ml(answers)
+        if not ml:
+            return None
+        mbti_type = predict_personality_by_ml(answers, bank)
         method = "ML-based"
-    
-    # Get predefined explanation
-    explanation = MBTI_EXPLANATIONS.get(mbti_type, f"Based on your responses, you have been classified as {mbti_type} personality type.")
-    
-    logger.info(f"Final prediction ({method}): {mbti_type}")
-    return mbti_type, explanation
+
+    return _record(key, mbti_type, method)
+
+async def predict_personality_by_ml_async(answers):
+    """
+    ML fallback half of predict_personality, run on the event loop
+
+    Encoding awaits the micro-batcher instead of blocking an inference
+    thread, so concurrent fallbacks coalesce up to MBTI_ML_BATCH_SIZE; the
+    single-row classifier call is cheap enough to run inline.
+    """
+    bank = question_bank.current
+    emb = await embed_text_async(" ".join(bank.scorer.answer_texts(answers)))
+    mbti_type = str(ml_fallback.classify(np.asarray(emb).reshape(1, -1))[0])
+    if config.DEBUG_LOG:
+        logger.debug(f"ML predicted MBTI type: {mbti_type}")
+    return _record((bank.etag, bank.scorer.cache_key(answers)), mbti_type, "ML-based")
+
+def predict_personality_hybrid(answers, top_k=3, bank=None, scorer=None):
+    """
+    Type distribution blending trait evidence with classifier probabilities
+
+    Uses the precomputed option table once the ML fallback is loaded (see
+    MBTI_PRELOAD_ML); it never waits for the model, so until then the
+    distribution comes from the trait evidence alone and ``method`` says so.
+    ``scorer`` is a HybridScorer already resolved for ``bank``; without it
+    one is fetched, building the option table if needed.
+    """
+    bank = bank or question_bank.current
+    scorer = scorer or ml_fallback.hybrid_scorer(bank)
+    method = "hybrid" if scorer.uses_ml else "trait-probabilistic"
+
+    key = (bank.etag, method, bank.scorer.cache_key(answers))
+    cached = result_cache.get(key)
+    if cached is None:
+        with STAGE_SECONDS.time(stage="hybrid_scoring"):
+            probs = scorer.distribution(bank.scorer.option_rows(answers))
+            cached = describe(probs, len(probs))
+        cached["explanation"] = explain(cached["mbti"])
+        cached["method"] = method
+        result_cache.set(key, cached)
+        PREDICTIONS.inc(method=method)
+    else:
+        PREDICTIONS.inc(method="cached")
+
+    if config.DEBUG_LOG:
+        logger.debug(f"Hybrid prediction ({method}): {cached['mbti']} ({cached['confidence']})")
+    return dict(cached, top=cached["top"][:top_k])
+
+def predict_personality_batch(answer_sets):
+    """
+    Predict MBTI personality types for many submissions in one call
+
+    Trait scoring runs as one matrix operation over the whole batch; any
+    submissions it cannot score go through a single batched ML fallback.
+    Returns a list of (mbti_type, explanation) tuples in input order.
+    """
+    bank = question_bank.current
+    scorer = bank.scorer
+    keys = [(bank.etag, scorer.cache_key(answers)) for answers in answer_sets]
+    results = [result_cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+
+    rows = []
+    failed = []
+    for i in misses:
+        try:
+            rows.append(scorer.option_rows(answer_sets[i]))
+        except Exception as e:
+            logger.warning(f"Trait-based prediction failed for submission {i}: {e}, falling back to ML")
+            rows.append([])
+            failed.append(i)
+
+    with STAGE_SECONDS.time(stage="trait_scoring"):
+        mbti_types = dict(zip(misses, (str(mbti) for mbti in scorer.predict_rows(rows)[0])))
+    if failed:
+        ml_types = predict_personality_by_ml_batch([answer_sets[i] for i in failed], bank)
+        mbti_types.update(zip(failed, ml_types))
+
+    for i, mbti_type in mbti_types.items():
+        results[i] = (mbti_type, explain(mbti_type))
+        result_cache.set(keys[i], results[i])
+
+    PREDICTIONS.inc(len(results) - len(misses), method="cached")
+    PREDICTIONS.inc(len(misses) - len(failed), method="trait-based")
+    PREDICTIONS.inc(len(failed), method="ML-based")
+    if config.DEBUG_LOG:
+        logger.debug(
+            f"Batch prediction completed for {len(results)} submissions "
+            f"({len(results) - len(misses)} cached, {len(failed)} ML-based)"
+        )
+    return results
+
+def cache_stats():
+    """
+    Hit, miss and eviction counters of the prediction caches
+    """
+    return {"results": result_cache.stats(), "embeddings": embedding_cache.stats()}
@@ -0,0 +1,145 @@
+"""
+Post-level preprocessing of the training corpus
+
+Each dataset row is one user's posts joined with ``|||``. Encoding a row as a
+single text wastes tokenization on everything past the model's token limit,
+so with pooling enabled rows are split into individual posts, cleaned of URLs
+and noise, truncated to roughly the token limit, encoded post by post and
+pooled back into one vector per user.
+
+The cleaned corpus is cached under ``<cache_dir>/<dataset-hash>/`` so later
+training runs skip the cleaning pass:
+
+- ``posts.txt``: one cleaned post per line, users in dataset order
+- ``counts.u32``: number of posts of each user
+- ``labels.u8``: each user's type as an index into MBTI_TYPES
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CORPUS_VERSION = 1
+POOLING_MODES = ("none", "mean", "max", "mean+max")
+
+# Posts are cut to about the encoder's 256-token window (~4 characters per token)
+MAX_POST_CHARS = 1024
+
+POST_SEPARATOR = "|||"
+URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def clean_post(post, max_chars=MAX_POST_CHARS):
+    """
+    Strip URLs, surrounding quotes and repeated whitespace from one post
+    """
+    post = URL_RE.sub(" ", post)
+    post = WHITESPACE_RE.sub(" ", post).strip(" '\"")
+    return post[:max_chars]
+
+
+def split_posts(row, max_chars=MAX_POST_CHARS):
+    """
+    Cleaned, non-empty posts of one dataset row; never empty so pooling has a row to reduce
+    """
+    posts = [clean_post(post, max_chars) for post in row.split(POST_SEPARATOR)]
+    return [post for post in posts if post] or [""]
+
+
+def pool(embeddings, counts, mode):
+    """
+    Pool consecutive post embeddings into one vector per user
+
+    ``counts`` holds each user's number of posts (all >= 1). "mean+max"
+    concatenates both poolings.
+    """
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    if mode == "mean":
+        return np.add.reduceat(embeddings, offsets, axis=0) / np.asarray(counts, dtype=np.float32)[:, None]
+    if mode == "max":
+        return np.maximum.reduceat(embeddings, offsets, axis=0)
+    if mode == "mean+max":
+        return np.hstack([pool(embeddings, counts, "mean"), pool(embeddings, counts, "max")])
+    raise ValueError(f"Unknown pooling mode {mode!r}, expected one of {POOLING_MODES}")
+
+
+def pool_single(embeddings, mode):
+    """
+    Shape single-text embeddings (one "post" each) like pooled training vectors
+    """
+    if mode == "mean+max":
+        return np.hstack([embeddings, embeddings])
+    return embeddings
+
+
+def corpus_path(cache_dir, data_hash):
+    return os.path.join(cache_dir, f"{data_hash[:16]}-v{CORPUS_VERSION}")
+
+
+def build_corpus(shards, path):
+    """
+    Clean every row of ``shards`` ((index, rows, labels) chunks) into a corpus at ``path``
+    """
+    parent = os.path.dirname(path) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".corpus-", dir=parent)
+    n_users = n_posts = 0
+    try:
+        with open(os.path.join(tmp_dir, "posts.txt"), "w", encoding="utf-8") as post_file, \
+                open(os.path.join(tmp_dir, "counts.u32"), "wb") as count_file, \
+                open(os.path.join(tmp_dir, "labels.u8"), "wb") as label_file:
+            for _, rows, labels in shards:
+                users = [split_posts(row) for row in rows]
+                for posts in users:
+                    post_file.write("\n".join(posts))
+                    post_file.write("\n")
+                count_file.write(np.array([len(posts) for posts in users], dtype=np.uint32).tobytes())
+                label_file.write(np.asarray(labels, dtype=np.uint8).tobytes())
+                n_users += len(users)
+                n_posts += sum(len(posts) for posts in users)
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"version": CORPUS_VERSION, "users": n_users, "posts": n_posts}, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Cleaned corpus cached at {path} ({n_users} users, {n_posts} posts)")
+    return path
+
+
+def ensure_corpus(shards, cache_dir, data_hash):
+    """
+    Path of the cleaned corpus for this dataset, building it from ``shards`` if missing
+    """
+    path = corpus_path(cache_dir, data_hash)
+    if os.path.isfile(os.path.join(path, "meta.json")):
+        logger.info(f"Using cleaned corpus at {path}")
+        return path
+    return build_corpus(shards, path)
+
+
+def iter_corpus(path, chunk_users):
+    """
+    Yield (index, users, labels) chunks of the cleaned corpus
+
+    ``users`` is a list of each user's posts; chunks line up with the
+    dataset chunks the corpus was built from when ``chunk_users`` matches.
+    """
+    counts = np.fromfile(os.path.join(path, "counts.u32"), dtype=np.uint32)
+    labels = np.fromfile(os.path.join(path, "labels.u8"), dtype=np.uint8)
+    with open(os.path.join(path, "posts.txt"), "r", encoding="utf-8") as post_file:
+        for index, start in enumerate(range(0, len(counts), chunk_users)):
+            stop = min(start + chunk_users, len(counts))
+            users = [[next(post_file).rstrip("\n") for _ in range(count)] for count in counts[start:stop]]
+            yield index, users, labels[start:stop]
@@ -0,0 +1,126 @@
+"""
+Shared question bank store
+
+The bank is loaded once into an immutable version holding the parsed
+questions, their pre-serialized JSON body and ETag, the compiled trait scorer
+and the adaptive question engine. Both the /questions endpoint and app.model
+read ``question_bank.current`` so they always agree. A watcher thread polls
+the file's mtime and atomically swaps in a new version when it changes.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from app import config
+from app.adaptive import AdaptiveEngine
+from app.scoring import TraitScorer
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionBankVersion:
+    """
+    One immutable, fully compiled version of the question bank
+    """
+
+    def __init__(self, questions, precompute_table=False):
+        self.questions = questions
+        self.body = json.dumps(questions, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self.scorer = TraitScorer(questions)
+        self.adaptive = AdaptiveEngine(
+            self.scorer,
+            accuracy=config.ADAPTIVE_ANSWER_ACCURACY,
+            confidence=config.ADAPTIVE_CONFIDENCE,
+            max_questions=config.ADAPTIVE_MAX_QUESTIONS,
+        )
+        if precompute_table:
+            try:
+                n_entries = self.scorer.build_type_table()
+                logger.info(f"Precomputed trait types for {n_entries} answer combinations")
+            except ValueError as e:
+                logger.warning(f"Skipping trait type table: {e}")
+
+
+class QuestionBank:
+    """
+    Loads the question bank file and hot-swaps it when the file changes
+    """
+
+    def __init__(self, path, precompute_table=False):
+        self.path = path
+        self.precompute_table = precompute_table
+        self._stamp = None
+        self._current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reload()
+
+    @property
+    def current(self):
+        return self._current
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """
+        Load the file if it changed since the last load; returns True if a new version was swapped in
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return False
+            try:
+                with open(self.path, "r") as f:
+                    questions = json.load(f)
+                version = QuestionBankVersion(questions, precompute_table=self.precompute_table)
+            finally:
+                # Remember the stamp even on failure so a broken file is reported once, not every poll
+                self._stamp = stamp
+            # A single reference assignment: readers see either the old or the new version
+            self._current = version
+        logger.info(f"Loaded {len(questions)} questions from {self.path} (etag {version.etag})")
+        return True
+
+    def start_watching(self, interval):
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="question-bank-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last good version while the file is mid-edit or invalid
+                logger.warning(f"Failed to reload question bank from {self.path}: {e}")
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header value matches the given ETag (weak comparison)
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+question_bank = QuestionBank(config.QUESTIONS_PATH, precompute_table=config.PRECOMPUTE_TRAIT_TABLE)
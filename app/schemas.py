@@ -0,0 +1,9 @@
+"""
+Request models shared by the API and offline scoring
+"""
+from pydantic import BaseModel
+
+
+class Answers(BaseModel):
+    # Each response is either the chosen option's text or its index
+    responses: list[str | int]
@@ -0,0 +1,198 @@
+"""
+Compiled trait scoring engine for the questionnaire
+
+The question bank is compiled once into a dense array of trait vectors (one
+row per option) and a hash index from ``(question id, option text)`` and
+``(question id, option index)`` to that row, so scoring a submission is a
+dictionary lookup per answer plus a single NumPy sum.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+# Trait order used for every score vector: each MBTI axis is a pair of columns
+TRAITS = ("E", "I", "S", "N", "T", "F", "J", "P")
+TRAIT_COLUMNS = {trait: column for column, trait in enumerate(TRAITS)}
+NEUTRAL_TRAIT = "X"
+
+# Letter picked for each axis when both sides score the same:
+# I, N and P are more common in the dataset, F slightly more common than T
+TIE_BREAKERS = ("I", "N", "F", "P")
+
+# Base-3 weights turning the four per-axis score signs into a 0-80 lookup code
+_SIGN_WEIGHTS = np.array([27, 9, 3, 1])
+
+
+def _build_type_table():
+    """
+    MBTI type for every combination of per-axis signs (first minus second letter)
+    """
+    table = []
+    for code in range(81):
+        letters = ""
+        for axis in range(4):
+            sign = (code // 3 ** (3 - axis)) % 3 - 1
+            if sign > 0:
+                letters += TRAITS[2 * axis]
+            elif sign < 0:
+                letters += TRAITS[2 * axis + 1]
+            else:
+                letters += TIE_BREAKERS[axis]
+        table.append(letters)
+    return np.array(table)
+
+
+TYPE_BY_SIGN_CODE = _build_type_table()
+
+# All 16 MBTI types in sorted order (the order a LabelEncoder would assign)
+MBTI_TYPES = tuple(sorted(set(TYPE_BY_SIGN_CODE.tolist())))
+
+
+def types_from_signs(signs):
+    """
+    MBTI types from per-axis signs (+1 first letter, -1 second, 0 tie) of shape (4,) or (n, 4)
+    """
+    return TYPE_BY_SIGN_CODE[(np.asarray(signs, dtype=np.int64) + 1) @ _SIGN_WEIGHTS]
+
+
+def types_from_counts(counts):
+    """
+    Derive MBTI types from trait counts of shape (8,) or (n, 8) in one pass
+    """
+    counts = np.asarray(counts)
+    return types_from_signs(np.sign(counts[..., 0::2] - counts[..., 1::2]))
+
+
+class TraitScorer:
+    """
+    Trait scoring engine compiled from a question bank
+    """
+
+    def __init__(self, questions):
+        self.questions = questions
+        self.question_ids = [q["id"] for q in questions]
+
+        n_options = sum(len(q["options"]) for q in questions)
+        # The trailing all-zero row absorbs unknown or out-of-range answers
+        self.null_row = n_options
+        self.vectors = np.zeros((n_options + 1, len(TRAITS)), dtype=np.int32)
+        self.option_texts = []
+        self.index = {}
+
+        self.option_offsets = []
+        self.type_table = None
+        self._table_strides = None
+
+        row = 0
+        for q in questions:
+            self.option_offsets.append(row)
+            for option_index, option in enumerate(q["options"]):
+                trait = option["trait"]
+                if trait != NEUTRAL_TRAIT:
+                    if trait not in TRAIT_COLUMNS:
+                        raise ValueError(f"Unknown trait {trait!r} in question {q['id']}")
+                    self.vectors[row, TRAIT_COLUMNS[trait]] = 1
+                self.index[(q["id"], option["text"])] = row
+                self.index[(q["id"], option_index)] = row
+                self.option_texts.append(option["text"])
+                row += 1
+
+    def option_rows(self, answers):
+        """
+        Map positional answers (option text or option index) to trait vector rows
+        """
+        index = self.index
+        null_row = self.null_row
+        return [
+            index.get((qid, answer), null_row)
+            for qid, answer in zip(self.question_ids, answers)
+        ]
+
+    def cache_key(self, answers):
+        """
+        Canonical hash of a submission: an option index and its text give the same key
+
+        The texts are hashed as a JSON array, so no answer text can imitate
+        the boundary between two answers.
+        """
+        canonical = json.dumps(self.answer_texts(answers), ensure_ascii=False)
+        return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+    def build_type_table(self, max_entries=1_000_000):
+        """
+        Precompute the type of every complete answer combination
+
+        The table is indexed by the mixed-radix code of the chosen option
+        indices, so ``lookup_type`` is one multiply-add per answer and a list
+        lookup. Returns the number of entries.
+        """
+        sizes = [len(q["options"]) for q in self.questions]
+        n_entries = int(np.prod(sizes, dtype=np.int64))
+        if n_entries > max_entries:
+            raise ValueError(f"Question bank has {n_entries} answer combinations, more than {max_entries}")
+
+        choices = np.indices(sizes).reshape(len(sizes), -1).T
+        counts = self.vectors[choices + np.array(self.option_offsets, dtype=np.intp)].sum(axis=1)
+        self.type_table = [str(t) for t in types_from_counts(counts)]
+        self._table_strides = [
+            (offset, int(np.prod(sizes[i + 1:], dtype=np.int64)))
+            for i, offset in enumerate(self.option_offsets)
+        ]
+        return n_entries
+
+    def lookup_type(self, rows):
+        """
+        Precomputed type for a complete submission, or None if not in the table
+        """
+        if self.type_table is None or len(rows) != len(self._table_strides):
+            return None
+        code = 0
+        for row, (offset, stride) in zip(rows, self._table_strides):
+            if row == self.null_row:
+                return None
+            code += (row - offset) * stride
+        return self.type_table[code]
+
+    def answer_texts(self, answers):
+        """
+        Resolve option indices back to their text, leaving free text untouched
+        """
+        texts = []
+        for qid, answer in zip(self.question_ids, answers):
+            try:
+                row = self.index.get((qid, answer), self.null_row)
+            except TypeError:
+                row = self.null_row
+            texts.append(self.option_texts[row] if row != self.null_row else str(answer))
+        texts.extend(str(answer) for answer in answers[len(self.question_ids):])
+        return texts
+
+    def trait_counts(self, answers):
+        return self.vectors[self.option_rows(answers)].sum(axis=0)
+
+    def score_rows(self, rows):
+        """
+        Score one submission from its option rows and return (mbti_type, trait_counts)
+        """
+        counts = self.vectors[rows].sum(axis=0)
+        return str(types_from_counts(counts)), counts
+
+    def predict(self, answers):
+        """
+        Score one submission and return (mbti_type, trait_counts)
+        """
+        return self.score_rows(self.option_rows(answers))
+
+    def predict_rows(self, rows):
+        """
+        Score many submissions from their option rows as one matrix operation
+
+        Returns (mbti_types, trait_counts) with one entry per submission.
+        """
+        width = max((len(r) for r in rows), default=0)
+        matrix = np.full((len(rows), width), self.null_row, dtype=np.intp)
+        for i, r in enumerate(rows):
+            matrix[i, :len(r)] = r
+        counts = self.vectors[matrix].sum(axis=1)
+        return types_from_counts(counts), counts
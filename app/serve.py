@@ -0,0 +1,145 @@
+"""
+Pre-fork multi-process server that shares loaded model weights
+
+The parent process imports the app and loads the ML fallback once, then binds
+the listening socket and forks the workers. Workers inherit the loaded
+encoder weights copy-on-write, and the classifier arrays are memory-mapped
+from the bundle file, so total memory stays nearly flat as workers are added.
+Threads (question watcher, inference pool, micro-batcher) are only started
+inside each worker by the app's lifespan, never before the fork.
+
+Usage:
+    python -m app.serve [--workers 4] [--host 0.0.0.0] [--port 8000] [--no-preload]
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+def bind_socket(host, port, backlog=2048):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """
+    Load everything workers should share before forking
+    """
+    from app.artifacts import find_bundle
+
+    # Training encodes with torch, which starts thread pools that do not survive
+    # a fork, so a missing bundle is trained in a separate process first
+    if find_bundle(config.DATA_PATH, config.ARTIFACT_DIR, config.EMBEDDING_MODEL,
+                   config.TRAIN_POOLING, config.TRAIN_CLASSIFIER) is None:
+        logger.info("No model bundle found, training one before forking workers...")
+        subprocess.run([sys.executable, "-m", "app.train"], check=True)
+
+    from app.model import ml_fallback
+
+    # The hybrid option table runs the encoder, so workers build it after the fork
+    ml_fallback.load(build_hybrid=False)
+
+
+def run_worker(sock, log_level):
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def spawn(sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, log_level)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the MBTI predictor with pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-preload", action="store_true", help="let each worker load the ML fallback lazily")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    # Importing the app loads the question bank and static assets once here
+    import app.main  # noqa: F401
+
+    if not args.no_preload:
+        preload()
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+
+    # Move everything allocated so far out of the collector's reach so that
+    # garbage collection in the workers does not touch (and copy) shared pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn(sock, args.log_level) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            workers.add(spawn(sock, args.log_level))
+
+    sock.close()
+    logger.info("All workers stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Server-side questionnaire sessions with incrementally updated trait scores
+
+A session records the option row chosen for each question and keeps the
+running trait count vector up to date as answers arrive, so the result is
+read straight from the accumulated counts. Answers are sent as a question id
+and option index instead of the full option texts.
+
+Sessions live in a ``SessionStore``. ``InMemorySessionStore`` keeps them in
+process with TTL and size-based eviction; another backend can be plugged in
+with ``MBTI_SESSION_BACKEND=package.module:ClassName``.
+"""
+import importlib
+from abc import ABC, abstractmethod
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app import config
+from app.scoring import TRAITS, types_from_counts
+
+
+class SessionError(Exception):
+    """
+    Raised for answers that cannot be applied to a session
+    """
+
+
+class StaleSession(SessionError):
+    """
+    Raised when the question bank was reloaded after the session started
+    """
+
+
+class Session:
+    """
+    One respondent's answers and their running trait counts
+    """
+
+    def __init__(self, session_id, bank):
+        self.id = session_id
+        self.etag = bank.etag
+        self.n_questions = len(bank.scorer.question_ids)
+        self.rows = {}
+        self.counts = np.zeros(len(TRAITS), dtype=np.int32)
+
+    def answer(self, bank, question_id, option):
+        """
+        Apply (or change) the answer to one question, updating the counts in place
+        """
+        if bank.etag != self.etag:
+            raise StaleSession("The question bank changed since this session started")
+        scorer = bank.scorer
+        row = scorer.index.get((question_id, option))
+        if row is None or isinstance(option, bool):
+            raise SessionError(f"Question {question_id} has no option {option}")
+
+        previous = self.rows.get(question_id)
+        if previous is not None:
+            self.counts -= scorer.vectors[previous]
+        self.counts += scorer.vectors[row]
+        self.rows[question_id] = row
+
+    @property
+    def answered(self):
+        return len(self.rows)
+
+    @property
+    def complete(self):
+        return self.answered >= self.n_questions
+
+    def mbti_type(self):
+        return str(types_from_counts(self.counts))
+
+
+class SessionStore(ABC):
+    """
+    Storage backend for sessions
+
+    Subclasses keep sessions by id; ``save`` is called after every change so
+    stores that serialize sessions see the update. A subclass missing one of
+    the abstract methods cannot be instantiated, so a broken backend fails at
+    startup rather than on its first request.
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        The live session with this id, or None if it is unknown or expired
+        """
+
+    @abstractmethod
+    def save(self, session):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id):
+        pass
+
+    def stats(self):
+        return {}
+
+    def create(self, bank):
+        session = Session(secrets.token_urlsafe(16), bank)
+        self.save(session)
+        return session
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local sessions, evicted after ``ttl`` seconds without activity
+
+    Sessions are kept in last-access order, so expired ones are always at the
+    front and eviction only looks there. Beyond ``max_sessions`` the least
+    recently used session is dropped.
+    """
+
+    def __init__(self, ttl=1800, max_sessions=100_000):
+        self.ttl = ttl or None
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _evict_expired(self, now):
+        if self.ttl is None:
+            return
+        while self._sessions:
+            _, (_, touched) = next(iter(self._sessions.items()))
+            if now - touched < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def save(self, session):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            self._sessions[session.id] = (session, now)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        return {"sessions": len(self._sessions), "evictions": self.evictions}
+
+
+def make_store(backend, ttl, max_sessions):
+    """
+    Build the configured store: "memory" or a "package.module:ClassName" path
+    """
+    if backend == "memory":
+        return InMemorySessionStore(ttl=ttl, max_sessions=max_sessions)
+    module_name, _, class_name = backend.partition(":")
+    if not class_name:
+        raise ValueError(f"Session backend must be 'memory' or 'package.module:ClassName', got {backend!r}")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(store_class, type) and issubclass(store_class, SessionStore)):
+        raise TypeError(f"Session backend {backend!r} is not a SessionStore subclass")
+    return store_class(ttl=ttl, max_sessions=max_sessions)
+
+
+session_store = make_store(config.SESSION_BACKEND, config.SESSION_TTL, config.SESSION_MAX)
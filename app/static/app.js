@@ -0,0 +1,175 @@
+let questions = [];
+let answers = [];
+let currentQuestion = 0;
+// Server-side session: answers are sent as they are picked, so submitting
+// only fetches the result; /predict is the fallback if the session is lost.
+// Answers are sent one at a time so a changed answer can never be overtaken
+// by the request it replaces; sentAnswers resolves to whether all succeeded
+let sessionId = null;
+let sentAnswers = Promise.resolve(true);
+
+async function loadQuestions() {
+    try {
+        const response = await fetch('/questions');
+        questions = await response.json();
+        displayQuestions();
+        startSession();
+    } catch (error) {
+        console.error('Error loading questions:', error);
+    }
+}
+
+async function startSession() {
+    sessionId = null;
+    sentAnswers = Promise.resolve(true);
+    try {
+        const response = await fetch('/session', { method: 'POST' });
+        if (response.ok) {
+            sessionId = (await response.json()).id;
+        }
+    } catch (error) {
+        console.error('Error starting session:', error);
+    }
+}
+
+function sendAnswer(questionIndex, optionIndex) {
+    if (!sessionId) {
+        return;
+    }
+    const id = sessionId;
+    const body = JSON.stringify({
+        question_id: questions[questionIndex].id,
+        option: optionIndex
+    });
+    sentAnswers = sentAnswers.then(ok => fetch(`/session/${id}/answer`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body
+    }).then(response => ok && response.ok).catch(() => false));
+}
+
+async function fetchSessionResult() {
+    if (!sessionId) {
+        return null;
+    }
+    if (!(await sentAnswers)) {
+        return null;
+    }
+    const response = await fetch(`/session/${sessionId}/result`);
+    if (!response.ok) {
+        return null;
+    }
+    const result = await response.json();
+    return result.complete ? result : null;
+}
+
+function displayQuestions() {
+    const questionnaire = document.getElementById('questionnaire');
+    questionnaire.innerHTML = '';
+
+    questions.forEach((q, index) => {
+        const questionDiv = document.createElement('div');
+        questionDiv.className = 'question';
+        questionDiv.innerHTML = `
+            <h3>Question ${index + 1}</h3>
+            <p>${q.question}</p>
+            <div class="options">
+                ${q.options.map((option, optIndex) => `
+                    <div class="option" onclick="selectOption(${index}, ${optIndex})">
+                        <input type="radio" name="q${index}" value="${option.text}" id="q${index}_${optIndex}">
+                        <label for="q${index}_${optIndex}">${option.text}</label>
+                    </div>
+                `).join('')}
+            </div>
+        `;
+        questionnaire.appendChild(questionDiv);
+    });
+}
+
+function selectOption(questionIndex, optionIndex) {
+    // Remove previous selection
+    const questionDiv = document.querySelectorAll('.question')[questionIndex];
+    questionDiv.querySelectorAll('.option').forEach(opt => opt.classList.remove('selected'));
+
+    // Add selection to clicked option
+    const selectedOption = questionDiv.querySelectorAll('.option')[optionIndex];
+    selectedOption.classList.add('selected');
+    selectedOption.querySelector('input').checked = true;
+
+    // Store answer as the option index; the server maps it back to the option
+    answers[questionIndex] = optionIndex;
+    sendAnswer(questionIndex, optionIndex);
+
+    // Update progress
+    const answered = answers.filter(a => a !== undefined).length;
+    const progress = (answered / questions.length) * 100;
+    document.getElementById('progressBar').style.width = progress + '%';
+
+    // Enable submit button if all questions answered
+    if (answered === questions.length) {
+        document.getElementById('submitBtn').disabled = false;
+    }
+}
+
+async function submitAnswers() {
+    const submitBtn = document.getElementById('submitBtn');
+    submitBtn.disabled = true;
+    submitBtn.textContent = 'Analyzing...';
+
+    try {
+        const sessionResult = await fetchSessionResult().catch(() => null);
+        if (sessionResult) {
+            displayResult(sessionResult);
+            return;
+        }
+
+        const response = await fetch('/predict', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                responses: answers.filter(a => a !== undefined)
+            })
+        });
+
+        const result = await response.json();
+        displayResult(result);
+    } catch (error) {
+        console.error('Error getting prediction:', error);
+        alert('Error getting prediction. Please try again.');
+    } finally {
+        submitBtn.disabled = false;
+        submitBtn.textContent = 'Get My Personality Type';
+    }
+}
+
+function displayResult(result) {
+    const resultDiv = document.getElementById('result');
+    resultDiv.innerHTML = `
+        <h2>Your Personality Type: ${result.mbti}</h2>
+        <p>${result.explanation}</p>
+        <button onclick="restartTest()" style="width: auto; margin-top: 15px;">Take Test Again</button>
+    `;
+    resultDiv.style.display = 'block';
+    resultDiv.scrollIntoView({ behavior: 'smooth' });
+}
+
+function restartTest() {
+    answers = [];
+    document.getElementById('result').style.display = 'none';
+    document.getElementById('submitBtn').disabled = true;
+    document.getElementById('progressBar').style.width = '0%';
+    startSession();
+
+    // Clear all selections
+    document.querySelectorAll('.option').forEach(opt => {
+        opt.classList.remove('selected');
+        opt.querySelector('input').checked = false;
+    });
+}
+
+// Load questions when page loads
+loadQuestions();
@@ -0,0 +1,395 @@
+"""
+Offline training entry point for the ML fallback model
+
+Training streams the dataset: the CSV is read in chunks of ``chunk_rows``,
+each chunk is encoded in batches of ``batch_size`` and its embeddings are
+appended to an on-disk file, so peak memory does not grow with the number of
+rows. The classifier is then fitted over the memory-mapped embeddings, either
+with ``LogisticRegression`` (the default, as before) or incrementally with
+``SGDClassifier.partial_fit`` for datasets that do not fit in memory.
+
+Each chunk is a shard whose embeddings are checkpointed to disk as soon as it
+is encoded, so a crashed run resumes from the completed shards. With
+``--workers N`` shards are encoded by N processes that each load the model.
+
+With ``--pooling`` other than "none", rows are split into individual cleaned
+posts (see app.preprocess), encoded post by post and pooled per user.
+
+Usage:
+    python -m app.train [--data data/mbti_1.csv] [--artifact-dir artifacts] [--model all-MiniLM-L6-v2]
+                        [--chunk-rows 1000] [--batch-size 64] [--classifier logreg|sgd] [--epochs 5]
+                        [--workers 1] [--pooling none|mean|max|mean+max] [--force]
+"""
+import argparse
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.artifacts import bundle_id, bundle_path, dataset_hash, save_bundle
+from app.preprocess import POOLING_MODES, ensure_corpus, iter_corpus, pool
+from app.scoring import MBTI_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Rows per partial_fit call when fitting the SGD classifier from the memmap
+SGD_BLOCK_ROWS = 4096
+
+
+def iter_chunks(data_path, chunk_rows):
+    """
+    Yield (types, posts) lists for consecutive chunks of the dataset
+    """
+    for chunk in pd.read_csv(data_path, usecols=["type", "posts"], chunksize=chunk_rows):
+        yield chunk["type"].astype(str).tolist(), chunk["posts"].fillna("").astype(str).tolist()
+
+
+def iter_shards(data_path, chunk_rows):
+    """
+    Yield (index, posts, labels) for every chunk of the dataset
+
+    Labels index MBTI_TYPES; each chunk is one checkpointed shard.
+    """
+    label_index = {mbti: i for i, mbti in enumerate(MBTI_TYPES)}
+    for index, (types, posts) in enumerate(iter_chunks(data_path, chunk_rows)):
+        unknown = set(types) - label_index.keys()
+        if unknown:
+            raise ValueError(f"Unknown MBTI types in dataset: {sorted(unknown)}")
+        yield index, posts, np.array([label_index[t] for t in types], dtype=np.uint8)
+
+
+def shard_path(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, f"shard-{index:06d}.npz")
+
+
+def write_shard(checkpoint_dir, index, embeddings, labels):
+    """
+    Write one shard's embeddings and labels atomically
+    """
+    path = shard_path(checkpoint_dir, index)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, embeddings=embeddings, labels=labels)
+    os.replace(tmp_path, path)
+
+
+def prepare_checkpoints(checkpoint_dir, manifest):
+    """
+    Create the checkpoint directory, discarding shards encoded with other settings
+    """
+    manifest_path = os.path.join(checkpoint_dir, "shards.json")
+    if os.path.isdir(checkpoint_dir):
+        try:
+            with open(manifest_path, "r") as f:
+                if json.load(f) == manifest:
+                    return
+        except (OSError, ValueError):
+            pass
+        logger.info(f"Discarding checkpoints in {checkpoint_dir} (different settings)")
+        shutil.rmtree(checkpoint_dir)
+    os.makedirs(checkpoint_dir)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+
+# Encoder loaded once per pool process by _init_worker
+_worker_encoder = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_encoder
+    try:
+        import torch
+
+        # Split the cores between the pool processes instead of oversubscribing
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+
+    _worker_encoder = SentenceTransformer(model_name)
+
+
+def _encode_shard(checkpoint_dir, index, rows, labels, batch_size, pooling="none", encoder=None):
+    encoder = encoder or _worker_encoder
+    if pooling == "none":
+        embeddings = np.asarray(encoder.encode(rows, batch_size=batch_size), dtype=np.float32)
+    else:
+        # rows are lists of cleaned posts: encode every post, then pool per user
+        posts = [post for user in rows for post in user]
+        post_embeddings = np.asarray(encoder.encode(posts, batch_size=batch_size), dtype=np.float32)
+        embeddings = pool(post_embeddings, [len(user) for user in rows], pooling)
+    write_shard(checkpoint_dir, index, embeddings, labels)
+    return len(rows)
+
+
+def encode_shards(data_path, checkpoint_dir, chunk_rows, batch_size, model_name=None, encoder=None, workers=1,
+                  pooling="none", corpus_dir=None):
+    """
+    Encode every shard not yet checkpointed in ``checkpoint_dir``
+
+    With ``workers > 1`` (and no ``encoder`` given) shards are encoded by a
+    pool of processes that each load the model once; otherwise they are
+    encoded in this process. At most two shards per worker are read ahead.
+    Unless ``pooling`` is "none", shards are read from the cleaned corpus at
+    ``corpus_dir`` and encoded post by post. Returns the total number of shards.
+    """
+    prepare_checkpoints(checkpoint_dir, {"chunk_rows": chunk_rows, "pooling": pooling})
+
+    def read_shards():
+        if pooling == "none":
+            return iter_shards(data_path, chunk_rows)
+        return iter_corpus(corpus_dir, chunk_rows)
+
+    n_shards = 0
+    pending = []
+    for shard in read_shards():
+        n_shards += 1
+        if not os.path.exists(shard_path(checkpoint_dir, shard[0])):
+            pending.append(shard[0])
+    if not pending:
+        logger.info(f"All {n_shards} shards already encoded in {checkpoint_dir}")
+        return n_shards
+    if len(pending) < n_shards:
+        logger.info(f"Resuming: {n_shards - len(pending)} of {n_shards} shards already encoded")
+
+    todo = set(pending)
+    shards = (shard for shard in read_shards() if shard[0] in todo)
+    n_rows = 0
+    done = 0
+    start = time.perf_counter()
+
+    def report(rows):
+        nonlocal n_rows, done
+        n_rows += rows
+        done += 1
+        elapsed = time.perf_counter() - start
+        logger.info(f"Encoded shard {done}/{len(pending)} ({n_rows / elapsed:.1f} rows/sec)")
+
+    if encoder is None and workers > 1:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # Spawn rather than fork: torch thread pools do not survive a fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(model_name, threads)) as executor:
+            in_flight = set()
+            for index, rows, labels in shards:
+                if len(in_flight) >= 2 * workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        report(future.result())
+                in_flight.add(executor.submit(_encode_shard, checkpoint_dir, index, rows, labels, batch_size, pooling))
+            for future in as_completed(in_flight):
+                report(future.result())
+        return n_shards
+
+    if encoder is None:
+        from sentence_transformers import SentenceTransformer
+
+        logger.info("Loading SentenceTransformer model...")
+        encoder = SentenceTransformer(model_name)
+    for index, rows, labels in shards:
+        report(_encode_shard(checkpoint_dir, index, rows, labels, batch_size, pooling, encoder=encoder))
+    return n_shards
+
+
+def assemble_shards(checkpoint_dir, n_shards, work_dir):
+    """
+    Concatenate the shards into memory-mapped embeddings and labels
+
+    Returns (embeddings, labels) as read-only memmaps.
+    """
+    embeddings_path = os.path.join(work_dir, "embeddings.f32")
+    labels_path = os.path.join(work_dir, "labels.u8")
+
+    n_rows = 0
+    dim = None
+    with open(embeddings_path, "wb") as emb_file, open(labels_path, "wb") as label_file:
+        for index in range(n_shards):
+            with np.load(shard_path(checkpoint_dir, index)) as shard:
+                emb = np.ascontiguousarray(shard["embeddings"], dtype=np.float32)
+                labels = np.ascontiguousarray(shard["labels"], dtype=np.uint8)
+            dim = emb.shape[1]
+            emb_file.write(emb.tobytes())
+            label_file.write(labels.tobytes())
+            n_rows += len(labels)
+
+    if n_rows == 0:
+        raise ValueError(f"No rows in checkpoints at {checkpoint_dir}")
+    X = np.memmap(embeddings_path, dtype=np.float32, mode="r", shape=(n_rows, dim))
+    y = np.memmap(labels_path, dtype=np.uint8, mode="r", shape=(n_rows,))
+    return X, y
+
+
+def fit_classifier(X, y, classifier="logreg", epochs=5, seed=0):
+    """
+    Fit the fallback classifier over (possibly memory-mapped) embeddings
+    """
+    if classifier == "logreg":
+        from sklearn.linear_model import LogisticRegression
+
+        clf = LogisticRegression(max_iter=1000)
+        clf.fit(X, y)
+        return clf
+
+    if classifier == "sgd":
+        from sklearn.linear_model import SGDClassifier
+
+        clf = SGDClassifier(loss="log_loss", random_state=seed)
+        classes = np.arange(len(MBTI_TYPES))
+        rng = np.random.default_rng(seed)
+        starts = np.arange(0, len(y), SGD_BLOCK_ROWS)
+        for epoch in range(epochs):
+            # Visit blocks in a different order each epoch; only one block is in memory
+            for block_start in rng.permutation(starts):
+                block = slice(block_start, block_start + SGD_BLOCK_ROWS)
+                clf.partial_fit(X[block], y[block], classes=classes)
+            logger.info(f"SGD epoch {epoch + 1}/{epochs} done")
+        return clf
+
+    raise ValueError(f"Unknown classifier {classifier!r}")
+
+
+def embed_dataset(data_path, model_name, work_dir, chunk_rows, batch_size, encoder=None, workers=1,
+                  pooling="none", checkpoint_dir=None, corpus_cache_dir=None):
+    """
+    Encode the dataset into memory-mapped (embeddings, labels) in ``work_dir``
+
+    Shards are checkpointed in ``checkpoint_dir`` and the cleaned corpus used
+    for pooling is cached in ``corpus_cache_dir`` (both ``work_dir`` when None).
+    """
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"Unknown pooling mode {pooling!r}, expected one of {POOLING_MODES}")
+    checkpoint_dir = checkpoint_dir or os.path.join(work_dir, "shards")
+
+    corpus_dir = None
+    if pooling != "none":
+        corpus_dir = ensure_corpus(
+            iter_shards(data_path, chunk_rows), corpus_cache_dir or work_dir, dataset_hash(data_path)
+        )
+    n_shards = encode_shards(data_path, checkpoint_dir, chunk_rows, batch_size, model_name=model_name,
+                             encoder=encoder, workers=workers, pooling=pooling, corpus_dir=corpus_dir)
+    return assemble_shards(checkpoint_dir, n_shards, work_dir)
+
+
+def train(data_path, model_name, encoder=None, work_dir=None, chunk_rows=None, batch_size=None,
+          classifier=None, epochs=None, workers=None, pooling=None, checkpoint_dir=None, corpus_cache_dir=None):
+    """
+    Encode every post in the dataset and fit the fallback classifier
+
+    Returns (embeddings, classifier, classes). The embeddings are a memmap
+    backed by a file in ``work_dir``, which must outlive them. Encoded shards
+    are kept in ``checkpoint_dir`` (``work_dir`` when None) so an interrupted
+    run can resume from them.
+    """
+    chunk_rows = chunk_rows or config.TRAIN_CHUNK_ROWS
+    batch_size = batch_size or config.TRAIN_BATCH_SIZE
+    classifier = classifier or config.TRAIN_CLASSIFIER
+    epochs = epochs or config.TRAIN_EPOCHS
+    workers = workers if workers is not None else config.TRAIN_WORKERS
+    workers = workers or os.cpu_count() or 1
+    pooling = pooling or config.TRAIN_POOLING
+
+    logger.info(f"Encoding posts from {data_path} in chunks of {chunk_rows} rows with {workers} workers "
+                f"(pooling: {pooling})...")
+    start = time.perf_counter()
+    X, y = embed_dataset(data_path, model_name, work_dir, chunk_rows, batch_size, encoder=encoder,
+                         workers=workers, pooling=pooling, checkpoint_dir=checkpoint_dir,
+                         corpus_cache_dir=corpus_cache_dir)
+    logger.info(f"Posts encoded: {X.shape[0]} rows in {time.perf_counter() - start:.1f}s")
+
+    logger.info(f"Training {classifier} classifier...")
+    clf = fit_classifier(X, y, classifier=classifier, epochs=epochs)
+    logger.info("Classifier trained")
+
+    return X, clf, np.array(MBTI_TYPES)
+
+
+def checkpoint_path(artifact_dir, data_hash, model_name, pooling="none", classifier="logreg"):
+    """
+    Shard checkpoint directory for this dataset, model and settings, kept until the bundle is saved
+    """
+    return os.path.join(artifact_dir, f".shards-{bundle_id(data_hash, model_name, pooling, classifier)}")
+
+
+def train_and_save(data_path, artifact_dir, model_name, encoder=None, force=False, **options):
+    """
+    Train into a scratch directory under ``artifact_dir`` and save the bundle
+
+    Shards are checkpointed next to the bundles, so rerunning after a crash
+    only encodes the shards that were not finished. Training holds an
+    exclusive lock on ``artifact_dir``, so processes that find no bundle at the
+    same time (e.g. ``uvicorn --workers N``) train it once: the others wait
+    and then load the bundle the first one saved, unless ``force`` is set.
+    """
+    data_hash = dataset_hash(data_path)
+    options["pooling"] = options.get("pooling") or config.TRAIN_POOLING
+    options["classifier"] = options.get("classifier") or config.TRAIN_CLASSIFIER
+    path = bundle_path(artifact_dir, data_hash, model_name, options["pooling"], options["classifier"])
+    checkpoint_dir = checkpoint_path(artifact_dir, data_hash, model_name, options["pooling"], options["classifier"])
+    os.makedirs(artifact_dir, exist_ok=True)
+    # The lock file is never removed: unlinking it would let a waiting process
+    # lock a file a newcomer can no longer open
+    with open(os.path.join(artifact_dir, ".train.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not force and os.path.isfile(os.path.join(path, "meta.json")):
+            logger.info(f"Bundle was trained by another process, using {path}")
+            return path
+        with tempfile.TemporaryDirectory(prefix=".work-", dir=artifact_dir) as work_dir:
+            X, clf, classes = train(data_path, model_name, encoder=encoder, work_dir=work_dir,
+                                    checkpoint_dir=checkpoint_dir,
+                                    corpus_cache_dir=os.path.join(artifact_dir, "corpus"), **options)
+            path = save_bundle(artifact_dir, X, clf, classes, data_hash, model_name, pooling=options["pooling"],
+                               classifier_name=options["classifier"])
+            del X
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and persist the MBTI fallback model bundle")
+    parser.add_argument("--data", default=config.DATA_PATH, help="training CSV with 'type' and 'posts' columns")
+    parser.add_argument("--artifact-dir", default=config.ARTIFACT_DIR, help="directory that holds model bundles")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL, help="SentenceTransformer model name")
+    parser.add_argument("--chunk-rows", type=int, default=config.TRAIN_CHUNK_ROWS, help="CSV rows read per chunk")
+    parser.add_argument("--batch-size", type=int, default=config.TRAIN_BATCH_SIZE, help="posts per encoder batch")
+    parser.add_argument("--classifier", choices=["logreg", "sgd"], default=config.TRAIN_CLASSIFIER)
+    parser.add_argument("--epochs", type=int, default=config.TRAIN_EPOCHS, help="passes over the data for sgd")
+    parser.add_argument("--workers", type=int, default=config.TRAIN_WORKERS,
+                        help="encoder processes (0 = one per CPU core)")
+    parser.add_argument("--pooling", choices=POOLING_MODES, default=config.TRAIN_POOLING,
+                        help="split rows into posts and pool their embeddings per user ('none' encodes whole rows)")
+    parser.add_argument("--force", action="store_true", help="retrain even if a matching bundle exists")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    path = bundle_path(args.artifact_dir, dataset_hash(args.data), args.model, args.pooling, args.classifier)
+    if os.path.isfile(os.path.join(path, "meta.json")) and not args.force:
+        logger.info(f"Bundle already up to date at {path}")
+        return 0
+
+    train_and_save(
+        args.data, args.artifact_dir, args.model, force=args.force,
+        chunk_rows=args.chunk_rows, batch_size=args.batch_size,
+        classifier=args.classifier, epochs=args.epochs, workers=args.workers, pooling=args.pooling,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
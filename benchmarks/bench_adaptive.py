@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Simulation: questions asked and selection cost of adaptive assessments
+
+Simulated respondents with a random true type answer synthetic question banks
+of growing size (plus the shipped bank). Each answer points at the
+respondent's own letter with probability weight ``--answer-accuracy``, at the
+opposite letter with the complement and at anything else with 0.5, the same
+noise model the engine assumes. Two policies use the same early-stopping rule:
+
+- adaptive: AdaptiveEngine.next_question
+- fixed: questions in bank order
+
+and the report lists the average number of questions asked, how often the
+full type was recovered, and the selection cost per call and per assessment.
+
+Usage:
+    python -m benchmarks.bench_adaptive [--respondents 500] [--sizes 100 1000 5000]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app import config
+from app.adaptive import AdaptiveEngine
+from app.scoring import TRAITS, TraitScorer
+
+
+def make_bank(n_questions, seed):
+    """
+    Synthetic bank: each question targets one axis with a letter for each side
+    and a neutral option; some add a letter from another axis
+    """
+    rng = random.Random(seed)
+    bank = []
+    for q in range(n_questions):
+        axis = rng.randrange(4)
+        traits = [TRAITS[2 * axis], TRAITS[2 * axis + 1], "X"]
+        if rng.random() < 0.3:
+            traits.append(rng.choice([t for t in TRAITS if t not in traits]))
+        rng.shuffle(traits)
+        bank.append({
+            "id": q + 1,
+            "question": f"Question {q + 1}",
+            "options": [{"text": f"Question {q + 1} option {o}", "trait": t} for o, t in enumerate(traits)],
+        })
+    return bank
+
+
+def choose_option(question, mbti_type, accuracy, rng):
+    """
+    Index of the option a respondent of ``mbti_type`` picks under the noise model
+    """
+    weights = []
+    for option in question["options"]:
+        trait = option["trait"]
+        if trait in mbti_type:
+            weights.append(accuracy)
+        elif trait != "X":
+            weights.append(1 - accuracy)
+        else:
+            weights.append(0.5)
+    return rng.choices(range(len(weights)), weights=weights)[0]
+
+
+def simulate(engine, bank, policy, respondents, accuracy, seed):
+    """
+    Per-assessment (questions asked, type recovered, selection seconds) and per-call seconds
+    """
+    rng = random.Random(seed)
+    scorer = engine.scorer
+    assessments = []
+    calls = []
+    for _ in range(respondents):
+        mbti_type = "".join(rng.choice(TRAITS[2 * axis:2 * axis + 2]) for axis in range(4))
+        asked = np.zeros(len(bank), dtype=bool)
+        rows = []
+        logodds = np.zeros(4)
+        spent = 0.0
+        while True:
+            start = time.perf_counter()
+            if policy == "adaptive":
+                position = engine.next_question(logodds, asked)
+            else:
+                decided = engine.confidence(logodds).min() >= engine.confidence_target
+                remaining = np.flatnonzero(~asked)
+                position = None if decided or not len(remaining) else int(remaining[0])
+            elapsed = time.perf_counter() - start
+            spent += elapsed
+            calls.append(elapsed)
+            if position is None:
+                break
+            question = bank[position]
+            asked[position] = True
+            rows.append(scorer.index[(question["id"], choose_option(question, mbti_type, accuracy, rng))])
+            logodds = engine.evidence(rows)
+        assessments.append((len(rows), engine.mbti_type(logodds) == mbti_type, spent))
+    return assessments, calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--respondents", type=int, default=500, help="simulated assessments per bank and policy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="synthetic bank sizes")
+    parser.add_argument("--answer-accuracy", type=float, default=config.ADAPTIVE_ANSWER_ACCURACY)
+    parser.add_argument("--confidence", type=float, default=config.ADAPTIVE_CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with open("app/questions.json", "r") as f:
+        banks = [("shipped", json.load(f))]
+    banks += [(str(size), make_bank(size, args.seed + size)) for size in args.sizes]
+
+    print(f"{'bank':>8} {'policy':>9} {'asked':>7} {'correct':>8} {'select us':>10} {'p95 us':>8} "
+          f"{'us/assessment':>14}")
+    for name, bank in banks:
+        engine = AdaptiveEngine(TraitScorer(bank), accuracy=args.answer_accuracy, confidence=args.confidence)
+        for policy in ("adaptive", "fixed"):
+            assessments, calls = simulate(engine, bank, policy, args.respondents, args.answer_accuracy, args.seed)
+            calls.sort()
+            print(
+                f"{name:>8} {policy:>9} "
+                f"{statistics.fmean(a[0] for a in assessments):>7.1f} "
+                f"{statistics.fmean(a[1] for a in assessments):>8.1%} "
+                f"{statistics.fmean(calls) * 1e6:>10.1f} "
+                f"{calls[int(0.95 * (len(calls) - 1))] * 1e6:>8.1f} "
+                f"{statistics.fmean(a[2] for a in assessments) * 1e6:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ML fallback accuracy versus latency for each encoder backend
+
+Encodes the last ``--holdout`` rows of the dataset with every backend and
+classifies them the way serving does. The bundle's classifier was fitted on
+every row, so a classifier of the same kind is refitted on the bundle's
+stored embeddings without the held-out rows, and the held-out rows are never
+seen in training. Reports per-request latency (one text per encode call, as a
+fallback request), batch throughput, mean cosine similarity of the embeddings
+to the torch backend, agreement of the predicted types with the torch backend
+and held-out accuracy against the labels. Needs sentence-transformers, the
+packages in requirements-onnx.txt and a trained bundle.
+
+Usage:
+    python -m benchmarks.bench_encoders [--backends torch onnx onnx-int8] [--holdout 500] [--requests 200]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.artifacts import find_bundle, load_bundle
+from app.encoders import BACKENDS, load_encoder
+from app.preprocess import pool_single
+from app.train import fit_classifier
+
+
+def load_split(data_path, n_holdout):
+    """
+    (training labels, held-out labels, held-out texts) with the last ``n_holdout`` rows held out
+    """
+    frame = pd.read_csv(data_path, usecols=["type", "posts"])
+    labels = frame["type"].astype(str).to_numpy()
+    texts = frame["posts"].fillna("").astype(str).tolist()
+    return labels[:-n_holdout], labels[-n_holdout:], texts[-n_holdout:]
+
+
+def holdout_classifier(bundle, train_labels):
+    """
+    The bundle's kind of classifier refitted on its embeddings of the training rows only
+    """
+    embeddings = bundle["embeddings"]
+    classes = [str(c) for c in bundle["classes"]]
+    y = np.array([classes.index(label) for label in train_labels])
+    return fit_classifier(embeddings[:len(y)], y, classifier=bundle["meta"].get("classifier", "logreg"),
+                          epochs=config.TRAIN_EPOCHS)
+
+
+def measure(encoder, texts, n_requests, batch_size):
+    """
+    (per-request latencies in ms, texts/sec for batched encoding, embeddings)
+    """
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        encoder.encode([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    embeddings = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+    throughput = len(texts) / (time.perf_counter() - start)
+    return latencies, throughput, embeddings
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--holdout", type=int, default=500, help="rows from the end of the dataset held out")
+    parser.add_argument("--requests", type=int, default=200, help="single-text encode calls timed per backend")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--quantization", default=config.ONNX_QUANTIZATION)
+    args = parser.parse_args(argv)
+
+    path = find_bundle(config.DATA_PATH, config.ARTIFACT_DIR, config.EMBEDDING_MODEL,
+                       config.TRAIN_POOLING, config.TRAIN_CLASSIFIER)
+    if path is None:
+        parser.error("no trained bundle found, run `python -m app.train` first")
+    bundle = load_bundle(path, load_embeddings=True)
+    train_labels, labels, texts = load_split(config.DATA_PATH, args.holdout)
+    if len(bundle["embeddings"]) != len(train_labels) + len(labels):
+        parser.error("the bundle was not trained on the current dataset")
+    classifier = holdout_classifier(bundle, train_labels)
+    pooling = bundle["meta"].get("pooling", "none")
+
+    # torch is the reference the other backends are compared against
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    reference = None
+    print(f"{'backend':>10} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8} "
+          f"{'cosine':>7} {'agree':>6} {'accuracy':>8}")
+    for backend in backends:
+        start = time.perf_counter()
+        encoder = load_encoder(
+            config.EMBEDDING_MODEL,
+            backend,
+            cache_dir=os.path.join(config.ARTIFACT_DIR, "encoders"),
+            quantization=args.quantization,
+        )
+        load_seconds = time.perf_counter() - start
+
+        latencies, throughput, embeddings = measure(encoder, texts, args.requests, args.batch_size)
+        predicted = bundle["classes"][classifier.predict(pool_single(embeddings, pooling))]
+        if reference is None:
+            reference = (embeddings, predicted)
+
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{backend:>10} {load_seconds:>7.1f} {statistics.median(latencies):>7.2f} {p95:>7.2f} "
+              f"{throughput:>8.1f} {cosine(embeddings, reference[0]):>7.4f} "
+              f"{np.mean(predicted == reference[1]):>6.1%} {np.mean(predicted == labels):>8.1%}")
+        del encoder
+
+
+if __name__ == "__main__":
+    main()
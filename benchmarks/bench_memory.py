@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: total server memory as the worker count grows
+
+Starts the server in two modes for each worker count and reports the summed
+PSS (proportional set size, which splits shared pages between the processes
+sharing them) and RSS of the whole process tree once memory has settled:
+
+- independent: ``uvicorn --workers N`` with MBTI_PRELOAD_ML=1, where every
+  worker imports the app and loads its own copy of the model
+- prefork: ``python -m app.serve --workers N``, where the parent loads the
+  model once and forks workers that share it
+
+Linux only (reads /proc). Needs the full ML stack and a trained bundle.
+
+Usage:
+    python -m benchmarks.bench_memory [--workers 1 2 4 8] [--port 8100]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+def process_tree(pid):
+    pids = [pid]
+    for child in _children(pid):
+        pids.extend(process_tree(child))
+    return pids
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_kb(pid):
+    """
+    (pss, rss) of one process in kB
+    """
+    pss = rss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+                elif line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+    except OSError:
+        pass
+    return pss, rss
+
+
+def tree_memory_mb(pid):
+    totals = [memory_kb(p) for p in process_tree(pid)]
+    return sum(t[0] for t in totals) / 1024, sum(t[1] for t in totals) / 1024, len(totals)
+
+
+def settle(pid, n_processes, timeout=600, interval=2.0, tolerance=0.01):
+    """
+    Wait until the expected processes exist and their total PSS stops changing
+    """
+    deadline = time.monotonic() + timeout
+    previous = None
+    stable = 0
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        pss, rss, count = tree_memory_mb(pid)
+        if count >= n_processes and previous and abs(pss - previous) <= tolerance * previous:
+            stable += 1
+            if stable >= 3:
+                return pss, rss, count
+        else:
+            stable = 0
+        previous = pss
+    raise TimeoutError("server memory did not settle")
+
+
+def measure(mode, workers, port):
+    env = dict(os.environ, MBTI_PRELOAD_ML="1")
+    if mode == "prefork":
+        cmd = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+        n_processes = workers + 1
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+        # uvicorn runs in-process for one worker and adds a supervisor otherwise
+        n_processes = workers + 1 if workers > 1 else 1
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        return settle(proc.pid, n_processes)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["independent", "prefork"], choices=["independent", "prefork"])
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':>12} {'workers':>7} {'procs':>5} {'PSS MB':>9} {'RSS MB':>9} {'PSS/worker':>10}")
+    for workers in args.workers:
+        for mode in args.modes:
+            pss, rss, count = measure(mode, workers, args.port)
+            print(f"{mode:>12} {workers:>7} {count:>5} {pss:>9.1f} {rss:>9.1f} {pss / workers:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: training wall time and accuracy of whole-row versus post-level encoding
+
+For each pooling mode the dataset is encoded from scratch ("none" encodes
+each row as one truncated text, the others split rows into cleaned posts and
+pool them per user), then a logistic regression is fitted on a random 80% of
+the users and scored on the remaining 20%. Reports the time to clean the
+corpus (cached across training runs), to encode and to fit, plus test accuracy.
+Needs sentence-transformers.
+
+Usage:
+    python -m benchmarks.bench_preprocess [--rows 2000] [--modes none mean mean+max]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.artifacts import dataset_hash
+from app.preprocess import POOLING_MODES, ensure_corpus
+from app.train import embed_dataset, fit_classifier, iter_shards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="dataset rows to use (0 = all)")
+    parser.add_argument("--modes", nargs="+", default=["none", "mean", "mean+max"], choices=POOLING_MODES)
+    parser.add_argument("--chunk-rows", type=int, default=config.TRAIN_CHUNK_ROWS)
+    parser.add_argument("--batch-size", type=int, default=config.TRAIN_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from sentence_transformers import SentenceTransformer
+
+    encoder = SentenceTransformer(config.EMBEDDING_MODEL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = config.DATA_PATH
+        if args.rows:
+            data_path = os.path.join(tmp, "data.csv")
+            pd.read_csv(config.DATA_PATH, nrows=args.rows).to_csv(data_path, index=False)
+
+        print(f"{'pooling':>9} {'dim':>5} {'clean s':>8} {'encode s':>9} {'rows/s':>8} {'fit s':>7} {'accuracy':>8}")
+        for mode in args.modes:
+            work_dir = tempfile.mkdtemp(dir=tmp)
+
+            start = time.perf_counter()
+            if mode != "none":
+                ensure_corpus(iter_shards(data_path, args.chunk_rows), work_dir, dataset_hash(data_path))
+            clean_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            X, y = embed_dataset(data_path, config.EMBEDDING_MODEL, work_dir, args.chunk_rows, args.batch_size,
+                                 encoder=encoder, pooling=mode)
+            encode_seconds = time.perf_counter() - start
+
+            order = np.random.default_rng(args.seed).permutation(len(y))
+            split = int(len(order) * 0.8)
+            train_rows, test_rows = np.sort(order[:split]), np.sort(order[split:])
+            start = time.perf_counter()
+            clf = fit_classifier(X[train_rows], y[train_rows])
+            fit_seconds = time.perf_counter() - start
+            accuracy = np.mean(clf.predict(X[test_rows]) == y[test_rows])
+
+            print(f"{mode:>9} {X.shape[1]:>5} {clean_seconds:>8.2f} {encode_seconds:>9.1f} "
+                  f"{len(y) / encode_seconds:>8.1f} {fit_seconds:>7.2f} {accuracy:>8.1%}")
+            del X, y
+
+
+if __name__ == "__main__":
+    main()
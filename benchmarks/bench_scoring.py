@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-request cost of trait scoring versus question bank size
+
+Compares the original linear scan over each question's options with the
+compiled TraitScorer index on synthetic banks of growing size. A submission
+always answers 10 questions; only the bank (questions x options) grows.
+
+Usage:
+    python -m benchmarks.bench_scoring [--repeat 20000]
+"""
+import argparse
+import random
+import timeit
+
+from app.scoring import TRAITS, TraitScorer
+
+
+def make_bank(n_questions, n_options):
+    """
+    Synthetic question bank with random trait assignments
+    """
+    rng = random.Random(n_questions * 1000 + n_options)
+    return [
+        {
+            "id": q + 1,
+            "question": f"Question {q + 1}",
+            "options": [
+                {"text": f"Question {q + 1} option {o}", "trait": rng.choice(TRAITS + ("X",))}
+                for o in range(n_options)
+            ],
+        }
+        for q in range(n_questions)
+    ]
+
+
+def linear_scan_counts(questions, answers):
+    """
+    The scoring loop the compiled index replaced
+    """
+    trait_scores = {trait: 0 for trait in TRAITS}
+    for i, answer in enumerate(answers):
+        if i < len(questions):
+            for option in questions[i]["options"]:
+                if option["text"] == answer:
+                    if option["trait"] != "X":
+                        trait_scores[option["trait"]] += 1
+                    break
+    return trait_scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20000, help="scoring calls per measurement")
+    args = parser.parse_args(argv)
+
+    print(f"{'questions':>9} {'options':>7} {'scan us':>9} {'text us':>9} {'index us':>9}")
+    for n_questions, n_options in [(10, 3), (100, 3), (1000, 30), (10000, 300)]:
+        bank = make_bank(n_questions, n_options)
+        scorer = TraitScorer(bank)
+        rng = random.Random(0)
+        picks = [rng.randrange(n_options) for _ in range(10)]
+        texts = [bank[i]["options"][p]["text"] for i, p in enumerate(picks)]
+
+        scan = timeit.timeit(lambda: linear_scan_counts(bank, texts), number=args.repeat)
+        by_text = timeit.timeit(lambda: scorer.predict(texts), number=args.repeat)
+        by_index = timeit.timeit(lambda: scorer.predict(picks), number=args.repeat)
+        print(
+            f"{n_questions:>9} {n_options:>7} "
+            f"{scan / args.repeat * 1e6:>9.2f} {by_text / args.repeat * 1e6:>9.2f} {by_index / args.repeat * 1e6:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Profile: what importing the app costs and what stays off the critical path
+
+Runs ``python -X importtime -c "import app.main"`` in a fresh interpreter and
+reports the total import time, the slowest top-level packages and whether
+each of the heavy ML packages was imported. With ``--serve`` it also starts
+uvicorn and reports how long /healthz and /readyz take to answer.
+
+Usage:
+    python -m benchmarks.import_profile [--top 15] [--serve] [--port 8100]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Loaded by the ML fallback only, never while importing the app
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "sklearn", "scipy", "pandas", "joblib")
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module):
+    """
+    {module: cumulative microseconds} for every module imported by ``module``
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=dict(os.environ, MBTI_PRELOAD_ML="0"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+def wait_for(url, timeout):
+    """
+    Seconds until ``url`` answers 200, or None on timeout
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level packages to list")
+    parser.add_argument("--serve", action="store_true", help="also time /healthz and /readyz under uvicorn")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    times = import_profile(args.module)
+    print(f"import {args.module}: {times.get(args.module, 0) / 1000:.1f} ms\n")
+
+    top_level = {}
+    for name, cumulative in times.items():
+        root = name.split(".")[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative)
+    print(f"{'package':>24} {'cumulative ms':>14}")
+    for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:>24} {cumulative / 1000:>14.1f}")
+
+    print(f"\n{'heavy module':>24} {'imported':>14}")
+    for name in HEAVY_MODULES:
+        print(f"{name:>24} {'yes' if name in top_level else 'no':>14}")
+
+    if args.serve:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            healthy = wait_for(f"{base}/healthz", args.timeout)
+            ready = wait_for(f"{base}/readyz", args.timeout) if healthy is not None else None
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        print(f"\n/healthz after {healthy:.2f}s" if healthy is not None else "\n/healthz never answered")
+        print(f"/readyz after {healthy + ready:.2f}s" if ready is not None else "/readyz never became ready")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load test: ML fallback encoding with and without micro-batching
+
+Each client sends requests back to back. Without batching every request runs
+its own encoder call in a thread pool; with batching requests take the path
+/predict's ML fallback takes, awaiting app.model.embed_text_async on the
+event loop so they coalesce in the app's micro-batcher. Reports throughput
+and p50/p99 latency at each concurrency level.
+
+By default the encoder is simulated as one shared compute device whose calls
+cost a fixed overhead plus a per-item cost, which is how a CPU-bound
+SentenceTransformer behaves once the cores are saturated. Pass --real to use
+the actual app.model ML fallback (needs sentence-transformers and the dataset).
+
+Usage:
+    python -m benchmarks.load_batching [--clients 1 16 128] [--requests 20] [--real]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import config
+from app.model import embed_text_async, encode_batcher
+
+
+class SimulatedEncoder:
+    """
+    Encoder stand-in: calls are serialized and cost overhead + per-item time
+    """
+
+    def __init__(self, overhead=0.004, per_item=0.0003):
+        self.overhead = overhead
+        self.per_item = per_item
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        with self._lock:
+            time.sleep(self.overhead + self.per_item * len(texts))
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run_clients(call, n_clients, n_requests):
+    latencies = []
+
+    async def client(client_id):
+        for i in range(n_requests):
+            start = time.perf_counter()
+            # Distinct per concurrency level so the embedding cache never answers
+            await call(f"{n_clients} clients: client {client_id} request {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(n_clients)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+async def measure(encode, n_clients, n_requests, batched, batch_size, delay_ms):
+    # Mirrors the size of anyio's default worker thread pool
+    executor = ThreadPoolExecutor(max_workers=40)
+    loop = asyncio.get_running_loop()
+    try:
+        if batched:
+            encode_batcher.func = encode
+            encode_batcher.max_batch_size = batch_size
+            encode_batcher.max_delay = delay_ms / 1000
+            await encode_batcher.start()
+            try:
+                return await run_clients(embed_text_async, n_clients, n_requests)
+            finally:
+                await encode_batcher.stop()
+
+        async def call(text):
+            return (await loop.run_in_executor(executor, encode, [text]))[0]
+
+        return await run_clients(call, n_clients, n_requests)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--batch-size", type=int, default=config.ML_BATCH_SIZE)
+    parser.add_argument("--delay-ms", type=float, default=config.ML_BATCH_DELAY_MS)
+    parser.add_argument("--real", action="store_true", help="use the real SentenceTransformer fallback")
+    args = parser.parse_args(argv)
+
+    if args.real:
+        from app.model import ml_fallback
+
+        ml_fallback.load()
+        encode = ml_fallback.encode
+    else:
+        encode = SimulatedEncoder().encode
+
+    print(f"{'clients':>7} {'mode':>9} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for n_clients in args.clients:
+        for batched in (False, True):
+            throughput, latencies = asyncio.run(
+                measure(encode, n_clients, args.requests, batched, args.batch_size, args.delay_ms)
+            )
+            print(
+                f"{n_clients:>7} {'batched' if batched else 'single':>9} {throughput:>9.1f} "
+                f"{statistics.median(latencies) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
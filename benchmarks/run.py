@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: predictor functions, startup time and HTTP endpoints
+
+Runs a fixed set of cases and reports per-operation latency (mean, p50, p95)
+and throughput:
+
+- traits: predict_personality_by_traits
+- predict_cold / predict_warm: predict_personality with an empty / warm result cache
+- ml: predict_personality_by_ml with an empty embedding cache (only with --ml;
+  needs sentence-transformers and a trained bundle)
+- hybrid_cold: predict_personality_hybrid with an empty result cache; blends in
+  the classifier's option table only when the ML case loaded the model
+- import: ``python -c "import app.main"`` in a fresh interpreter
+- http_index, http_questions, http_predict: ``GET /``, ``GET /questions`` and
+  ``POST /predict`` through an in-process ASGI client (httpx)
+- http_hybrid: ``POST /predict?mode=hybrid``
+- http_replay: ``POST /predict`` replaying the ``{"responses": [...]}`` lines
+  of a recorded JSONL file
+
+Answer sets are generated from the question bank with a fixed seed, mixing
+option texts and indices. Results are written as JSON; with a baseline every
+case's p50 is compared against it and the run exits with status 1 when any
+case is slower than the baseline by more than ``--threshold``.
+
+Usage:
+    python -m benchmarks.run [--output results.json] [--baseline benchmarks/baseline.json]
+                             [--threshold 0.25] [--save-baseline] [--cases traits http_predict] [--ml]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_REPLAY = os.path.join("benchmarks", "requests.jsonl")
+
+CASES = (
+    "traits", "predict_cold", "predict_warm", "ml", "hybrid_cold", "import",
+    "http_index", "http_questions", "http_predict", "http_hybrid", "http_replay",
+)
+
+
+def generate_answer_sets(questions, n, seed):
+    """
+    Complete answer sets, each answer randomly given as option text or index
+    """
+    rng = random.Random(seed)
+    answer_sets = []
+    for _ in range(n):
+        answers = []
+        for question in questions:
+            index = rng.randrange(len(question["options"]))
+            answers.append(index if rng.random() < 0.5 else question["options"][index]["text"])
+        answer_sets.append(answers)
+    return answer_sets
+
+
+def load_replay(path):
+    """
+    Response lists of every line in a JSONL file that carries "responses"
+    """
+    answer_sets = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict) and isinstance(record.get("responses"), list):
+                answer_sets.append(record["responses"])
+    return answer_sets
+
+
+def summarize(samples):
+    """
+    Latency statistics in microseconds for a list of per-operation seconds
+    """
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": statistics.median(samples) * 1e6,
+        "p95_us": samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1e6,
+        "ops_per_sec": len(samples) / sum(samples) if sum(samples) else 0.0,
+    }
+
+
+def time_calls(op, inputs, iterations, warmup):
+    for i in range(warmup):
+        op(inputs[i % len(inputs)])
+    gc.collect()
+    samples = []
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        op(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def time_async_calls(op, inputs, iterations, warmup):
+    for i in range(warmup):
+        await op(inputs[i % len(inputs)])
+    gc.collect()
+    samples = []
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        await op(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_function_cases(cases, answer_sets, iterations, warmup):
+    from app import model
+
+    bank = model.question_bank.current
+    results = {}
+
+    if "traits" in cases:
+        results["traits"] = time_calls(
+            lambda answers: model.predict_personality_by_traits(answers, bank), answer_sets, iterations, warmup
+        )
+
+    if "predict_cold" in cases:
+        def predict_cold(answers):
+            model.result_cache.clear()
+            return model.predict_personality(answers)
+
+        results["predict_cold"] = time_calls(predict_cold, answer_sets, iterations, warmup)
+
+    if "predict_warm" in cases:
+        warm_sets = answer_sets[:64]
+        for answers in warm_sets:
+            model.predict_personality(answers)
+        results["predict_warm"] = time_calls(model.predict_personality, warm_sets, iterations, warmup)
+
+    if "ml" in cases:
+        model.ml_fallback.load()
+
+        def predict_ml(answers):
+            model.embedding_cache.clear()
+            return model.predict_personality_by_ml(answers, bank)
+
+        results["ml"] = time_calls(predict_ml, answer_sets, max(1, iterations // 10), warmup)
+
+    if "hybrid_cold" in cases:
+        def predict_hybrid_cold(answers):
+            model.result_cache.clear()
+            return model.predict_personality_hybrid(answers)
+
+        results["hybrid_cold"] = time_calls(predict_hybrid_cold, answer_sets, iterations, warmup)
+
+    return results
+
+
+def run_import_case(runs):
+    """
+    Wall time of importing the app in a fresh interpreter
+    """
+    env = dict(os.environ, MBTI_PRELOAD_ML="0")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app.main"], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run_http_cases(cases, answer_sets, replay_sets, iterations, warmup):
+    import httpx
+
+    from app.main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(path):
+            response = await client.get(path)
+            response.raise_for_status()
+
+        async def post_predict(answers):
+            response = await client.post("/predict", json={"responses": answers})
+            response.raise_for_status()
+
+        if "http_index" in cases:
+            results["http_index"] = await time_async_calls(get, ["/"], iterations, warmup)
+        if "http_questions" in cases:
+            results["http_questions"] = await time_async_calls(get, ["/questions"], iterations, warmup)
+        if "http_predict" in cases:
+            results["http_predict"] = await time_async_calls(post_predict, answer_sets, iterations, warmup)
+        if "http_hybrid" in cases:
+            async def post_hybrid(answers):
+                response = await client.post("/predict?mode=hybrid", json={"responses": answers})
+                response.raise_for_status()
+
+            results["http_hybrid"] = await time_async_calls(post_hybrid, answer_sets, iterations, warmup)
+        if "http_replay" in cases and replay_sets:
+            results["http_replay"] = await time_async_calls(post_predict, replay_sets, iterations, warmup)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    (case, baseline p50, current p50, ratio, regressed) for cases present in both
+    """
+    rows = []
+    for name, stats in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        ratio = stats["p50_us"] / reference["p50_us"] if reference["p50_us"] else float("inf")
+        rows.append((name, reference["p50_us"], stats["p50_us"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=[c for c in CASES if c != "ml"])
+    parser.add_argument("--ml", action="store_true", help="also run the ML fallback case")
+    parser.add_argument("--iterations", type=int, default=2000, help="timed calls per function case")
+    parser.add_argument("--http-iterations", type=int, default=500, help="timed requests per HTTP case")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", default=DEFAULT_REPLAY, help="JSONL file of recorded requests to replay")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p50 slowdown against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    cases = set(args.cases) | ({"ml"} if args.ml else set())
+
+    from app import model  # noqa: F401  (imported here so its logging setup can be silenced)
+
+    logging.disable(logging.WARNING)
+
+    questions = model.question_bank.current.questions
+    answer_sets = generate_answer_sets(questions, max(args.iterations, args.http_iterations), args.seed)
+    replay_sets = load_replay(args.replay) if os.path.isfile(args.replay) else []
+
+    samples = run_function_cases(cases, answer_sets, args.iterations, args.warmup)
+    if "import" in cases:
+        samples["import"] = run_import_case(args.import_runs)
+    samples.update(asyncio.run(run_http_cases(cases, answer_sets, replay_sets, args.http_iterations, args.warmup)))
+
+    results = {name: summarize(samples[name]) for name in CASES if name in samples}
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "replay": args.replay if replay_sets else None,
+        },
+        "results": results,
+    }
+
+    print(f"{'case':>15} {'n':>6} {'mean us':>10} {'p50 us':>10} {'p95 us':>10} {'ops/s':>10}", file=sys.stderr)
+    for name, stats in results.items():
+        print(f"{name:>15} {stats['n']:>6} {stats['mean_us']:>10.1f} {stats['p50_us']:>10.1f} "
+              f"{stats['p95_us']:>10.1f} {stats['ops_per_sec']:>10.1f}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}; skipping regression check", file=sys.stderr)
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = 0
+    print(f"\n{'case':>15} {'base p50':>10} {'p50':>10} {'ratio':>7}", file=sys.stderr)
+    for name, base, current, ratio, regressed in compare(results, baseline, args.threshold):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:>15} {base:>10.1f} {current:>10.1f} {ratio:>7.2f}{flag}", file=sys.stderr)
+    if regressions:
+        print(f"{regressions} case(s) slower than the baseline by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())